@@ -0,0 +1,110 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+bench_startup.py--measure how long it takes to import pcr_utils.server and
+                  how long a new server process takes until it listens.
+
+                  The public IP lookup is replaced by one that takes --lookup
+                  seconds (like a slow or missing internet connection), the
+                  server should listen long before it has finished.
+
+                  python3 benchmarks/bench_startup.py --lookup 3
+'''
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import harness
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds the stubbed public IP lookup of the server takes.
+LOOKUP_DELAY = "PCR_BENCH_LOOKUP_DELAY"
+
+IMPORT = ("import sys, time\n"
+          f"sys.path.insert(0, {ROOT!r})\n"
+          "start = time.perf_counter()\n"
+          "import pcr_utils.server\n"
+          "print(time.perf_counter() - start)\n")
+
+
+def serve():
+    ''' Run the server with a slow public IP lookup. '''
+
+    def slow_lookup(resolver=None):
+        time.sleep(float(os.environ.get(LOOKUP_DELAY, "0")))
+
+    harness.ipv4_addresses.get_public = slow_lookup
+    harness.serve()
+
+
+def import_time(directory):
+    ''' Return the seconds it takes to import pcr_utils.server in a new
+        interpreter. '''
+
+    output = subprocess.run([sys.executable, "-c", IMPORT], cwd=directory,
+                            capture_output=True, check=True, text=True)
+
+    return float(output.stdout.split()[-1])
+
+
+def time_to_listen(directory, engine, lookup):
+    ''' Return the seconds from starting a server process until it accepts
+        connections. '''
+
+    os.environ[LOOKUP_DELAY] = str(lookup)
+    start = time.perf_counter()
+    server = harness.start_server(__file__, directory, harness.free_port(),
+                                  {"server": {"engine": engine}})
+    elapsed = time.perf_counter() - start
+    harness.stop_server(server)
+
+    return elapsed
+
+
+def median(values):
+    ''' Return the median of a list of values. '''
+
+    values = sorted(values)
+
+    return values[len(values) // 2]
+
+
+def main():
+    ''' Parse the arguments and print the results. '''
+
+    if harness.SERVE in sys.argv:
+        serve()
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--lookup", type=float, default=3,
+                        help="seconds the public IP lookup takes")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        imports = [import_time(directory) for _ in range(args.runs)]
+        print(f"import pcr_utils.server        "
+              f"{median(imports) * 1000:8.1f} ms")
+
+        for engine in ("threads", "asyncio"):
+            listen = [time_to_listen(directory, engine, args.lookup)
+                      for _ in range(args.runs)]
+            print(f"time to listen ({engine:>7})     "
+                  f"{median(listen) * 1000:8.1f} ms "
+                  f"(public IP lookup {args.lookup:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
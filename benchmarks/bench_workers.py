@@ -0,0 +1,181 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+bench_workers.py--measure how the broadcast throughput of the server scales
+                  with the number of worker processes.
+
+                  For every worker count the server is started in a temporary
+                  directory on 127.0.0.1, framed clients connect from several
+                  load processes and a share of them send chat messages to the
+                  room. The benchmark reports the number of messages delivered
+                  to the clients per second. The public IP lookup is stubbed,
+                  so no internet connection is needed.
+
+                  python3 benchmarks/bench_workers.py --workers 1 2 4
+'''
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import harness
+from pcr_utils import framing
+
+MARK = b"BENCH:"  # Start of the benchmark messages, the rest is presence.
+
+
+async def client(port, alias, expected, messages, size, ready, go):
+    ''' Connect, wait for the start and send messages if messages > 0,
+        then count the benchmark messages until all expected messages were
+        received. Returns the time of the last message. '''
+
+    reader, writer = await harness.connect(port, alias)
+
+    ready()
+    await go.wait()
+
+    payload = MARK + b"x" * max(0, size - len(MARK))
+
+    for _ in range(messages):
+        writer.write(framing.encode(payload))
+
+    frames = framing.FrameReader()
+    received = 0
+    last = time.perf_counter()
+
+    while received < expected:
+        data = await reader.read(framing.RECV_SIZE)
+
+        if not data:
+            break
+
+        last = time.perf_counter()
+        received += sum(frame.startswith(MARK) for frame in frames.feed(data))
+
+    writer.close()
+    return received, last
+
+
+async def load(port, index, clients, senders, expected, messages, size,
+               connected, start_at):
+    ''' Run the clients of one load process. '''
+
+    go = asyncio.Event()
+    count = [0]
+
+    def ready():
+        count[0] += 1
+
+        if count[0] == clients:
+            connected.release()
+
+    tasks = [asyncio.ensure_future(client(
+        port, f"load{index}-{number}", expected,
+        messages if number < senders else 0, size, ready, go))
+        for number in range(clients)]
+
+    # Wait until every load process has connected its clients.
+    while start_at.value == 0:
+        await asyncio.sleep(0.01)
+
+    go.set()
+    results = await asyncio.gather(*tasks)
+
+    return (sum(received for received, _ in results),
+            max(last for _, last in results))
+
+
+def run_load(args):
+    ''' Target of a load process. '''
+
+    return asyncio.run(load(*args))
+
+
+def bench(workers, clients, senders, messages, size, processes):
+    ''' Return the delivered messages and the seconds it took for one
+        worker count. '''
+
+    with tempfile.TemporaryDirectory() as directory:
+        port = harness.free_port()
+        server = harness.start_server(__file__, directory, port, {
+            "server": {"engine": "asyncio", "workers": workers},
+            "outbound": {"max_messages": 1000000,
+                         "max_bytes": 1073741824},
+        }, settle=1 + workers * 0.5)
+
+        context = multiprocessing.get_context("spawn")
+        manager = context.Manager()
+        connected = manager.Semaphore(0)
+        start_at = manager.Value("d", 0.0)
+        expected = senders * messages
+
+        shares = [clients // processes + (index < clients % processes)
+                  for index in range(processes)]
+        sender_shares = [senders // processes + (index < senders % processes)
+                         for index in range(processes)]
+
+        try:
+            with context.Pool(processes) as pool:
+                result = pool.map_async(run_load, [
+                    (port, index, shares[index], sender_shares[index],
+                     expected, messages, size, connected, start_at)
+                    for index in range(processes)])
+
+                for _ in range(processes):
+                    connected.acquire()
+
+                start = time.perf_counter()
+                start_at.value = start
+                results = result.get(timeout=600)
+
+        finally:
+            harness.stop_server(server)
+            manager.shutdown()
+
+    delivered = sum(received for received, _ in results)
+    elapsed = max(last for _, last in results) - start
+
+    return delivered, elapsed
+
+
+def main():
+    ''' Parse the arguments and print the results. '''
+
+    if harness.SERVE in sys.argv:
+        harness.serve()
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=400)
+    parser.add_argument("--senders", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--processes", type=int,
+                        default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {args.senders} senders x "
+          f"{args.messages} messages of {args.size} bytes, "
+          f"{args.processes} load processes")
+    print(f"{'workers':>8} {'delivered':>10} {'seconds':>8} {'msg/s':>10}")
+
+    for workers in args.workers:
+        delivered, elapsed = bench(workers, args.clients, args.senders,
+                                   args.messages, args.size, args.processes)
+        print(f"{workers:>8} {delivered:>10} {elapsed:>8.2f} "
+              f"{delivered / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+harness.py--shared parts of the benchmarks. Starts the server in a temporary
+            directory on 127.0.0.1 with the given settings and connects
+            clients to it. The public IP lookup is stubbed, so the benchmarks
+            run without an internet connection.
+'''
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from pcr_utils import framing  # noqa: E402
+from pcr_utils import ipv4_addresses  # noqa: E402
+
+# The server (and its spawned workers, which import the benchmark again)
+#   must not look up the public IP address.
+ipv4_addresses.get_public = lambda resolver=None: None
+
+SERVE = "--serve"  # Argument that runs a benchmark script as the server.
+
+
+def free_port():
+    ''' Return a free TCP port on 127.0.0.1. '''
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve():
+    ''' Run the server in the current directory until stdin is closed. '''
+
+    from pcr_utils import server
+
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+
+    sys.stdin.read()
+    server.stop()
+    thread.join(10)
+
+
+def write_settings(directory, port, options):
+    ''' Write the .pcr_ip_port.txt and .pcr_server.ini files, options is a
+        dict of {section: {option: value}}. '''
+
+    with open(os.path.join(directory, ".pcr_ip_port.txt"), "w",
+              encoding="utf-8") as file:
+        file.write(f"127.0.0.1:{port}")
+
+    with open(os.path.join(directory, ".pcr_server.ini"), "w",
+              encoding="utf-8") as file:
+        for section, values in options.items():
+            file.write(f"[{section}]\n")
+
+            for option, value in values.items():
+                file.write(f"{option} = {value}\n")
+
+
+def start_server(script, directory, port, options, settle=0.0):
+    ''' Start the server by running script with SERVE in directory and wait
+        until it accepts connections. The server stops when its stdin is
+        closed. settle gives more processes (i.e. workers) time to bind. '''
+
+    write_settings(directory, port, options)
+
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(script), SERVE],
+        cwd=directory, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 30
+
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("the server has stopped")
+
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            time.sleep(settle)
+            return process
+
+        except OSError:
+            time.sleep(0.05)
+
+    process.kill()
+    raise RuntimeError("the server did not start")
+
+
+def stop_server(process):
+    ''' Stop a server started by start_server(). '''
+
+    process.stdin.close()
+
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def rss(pid):
+    ''' Return the resident memory in bytes of a process and its children
+        (i.e. worker processes) or None where /proc is not available. '''
+
+    def read(pid):
+        with open(f"/proc/{pid}/status", encoding="utf-8") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    try:
+        total = read(pid)
+    except OSError:
+        return None
+
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+
+        try:
+            with open(f"/proc/{entry}/stat", encoding="utf-8") as file:
+                # The parent pid follows the name in parentheses.
+                parent = int(file.read().rsplit(")", 1)[1].split()[1])
+
+            if parent == pid:
+                total += read(entry)
+
+        except (OSError, IndexError, ValueError):
+            continue
+
+    return total
+
+
+async def connect(port, alias, framed=True):
+    ''' Connect a client and answer the "ALIAS" prompt, returns the asyncio
+        (reader, writer) of the connection. '''
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port,
+                                                   limit=framing.RECV_SIZE)
+    await reader.readexactly(len(b"ALIAS"))
+
+    if framed:
+        writer.write(framing.HELLO + framing.encode(alias.encode()))
+        await reader.readexactly(len(framing.HELLO))
+    else:
+        writer.write(alias.encode())
+
+    return reader, writer
+
+
+class LineReader():
+    ''' Splits the data a client of the original protocol receives into
+        lines, the benchmark messages end with a newline. '''
+
+    def __init__(self):
+        self._buffer = b""
+
+    def feed(self, data):
+        ''' Return the complete lines of the received data. '''
+
+        *lines, self._buffer = (self._buffer + data).split(b"\n")
+
+        return lines
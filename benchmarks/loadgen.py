@@ -0,0 +1,354 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+loadgen.py--a load generator for the chat room server.
+
+            Starts the server on 127.0.0.1 with the given engine and settings,
+            connects N clients that answer the "ALIAS" prompt and lets a share
+            of them send messages at a fixed total rate for a while. Every
+            message carries the time it was sent, so each client measures the
+            fan-out latency from sending to receiving it. Runs without an
+            internet connection, the public IP lookup is stubbed.
+
+            Reports:
+                accept rate    clients that completed the handshake per second
+                memory         resident memory of the server per connection
+                throughput     messages sent and delivered per second
+                latency        p50/p95/p99 of the fan-out latency
+
+            python3 benchmarks/loadgen.py --engine asyncio --clients 500 \\
+                --rate 200 --duration 10 --set outbound.policy=disconnect
+'''
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+
+import harness
+from pcr_utils import framing
+
+MARK = b"LOAD:"  # Start of the load messages, the rest is presence.
+STAMP = struct.Struct("!d")  # Send time of a message.
+
+# Seconds the clients keep reading after the last message was sent.
+GRACE = 5
+
+
+def payload(size, legacy):
+    ''' Return a function that builds a message with the current time. '''
+
+    padding = b"x" * max(0, size - len(MARK) - STAMP.size * 2 - 1)
+
+    def build():
+        # The time is sent as hex, so it never contains the newline that
+        #   ends a legacy message.
+        stamp = STAMP.pack(time.monotonic()).hex().encode()
+        message = MARK + stamp + padding
+
+        if legacy:
+            return message + b"\n"
+
+        return framing.encode(message)
+
+    return build
+
+
+def stamp(message):
+    ''' Return the send time of a load message. '''
+
+    start = len(MARK)
+
+    return STAMP.unpack(bytes.fromhex(
+        message[start:start + STAMP.size * 2].decode()))[0]
+
+
+async def client(port, alias, options, ready, go):
+    ''' One client, returns (latencies, seconds to connect). '''
+
+    started = time.monotonic()
+    reader, writer = await harness.connect(port, alias,
+                                           framed=not options["legacy"])
+    connected = time.monotonic()
+    ready(started, connected)
+
+    await go.wait()
+
+    if options["rate"]:
+        asyncio.ensure_future(send(writer, options))
+
+    split = (harness.LineReader() if options["legacy"]
+             else framing.FrameReader())
+    latencies = array("d")
+    expected = options["expected"]
+    deadline = time.monotonic() + options["duration"] + GRACE
+
+    while len(latencies) < expected:
+        try:
+            data = await asyncio.wait_for(reader.read(framing.RECV_SIZE),
+                                          deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            break
+
+        if not data:
+            break
+
+        now = time.monotonic()
+
+        for message in split.feed(data):
+            # Legacy clients may see presence text before a message.
+            position = message.find(MARK)
+
+            if position >= 0:
+                latencies.append(now - stamp(message[position:]))
+
+    writer.close()
+
+    return latencies, connected - started
+
+
+async def send(writer, options):
+    ''' Send messages at the rate of one sender. '''
+
+    build = payload(options["size"], options["legacy"])
+    interval = 1 / options["rate"]
+    start = time.monotonic()
+
+    for number in range(options["messages"]):
+        delay = start + number * interval - time.monotonic()
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        writer.write(build())
+        await writer.drain()
+
+
+async def load(port, index, clients, senders, options, connected, go_flag):
+    ''' Run the clients of one load process. '''
+
+    go = asyncio.Event()
+    times = []
+
+    def ready(started, done):
+        times.append((started, done))
+
+        if len(times) == clients:
+            connected.release()
+
+    tasks = []
+
+    for number in range(clients):
+        client_options = dict(options)
+
+        if number >= senders:
+            client_options["rate"] = 0
+
+        tasks.append(asyncio.ensure_future(client(
+            port, f"load{index}-{number}", client_options, ready, go)))
+
+    # Wait until every load process has connected its clients.
+    while not go_flag.value:
+        if any(task.done() and task.exception() for task in tasks):
+            await asyncio.gather(*tasks)
+        await asyncio.sleep(0.01)
+
+    go.set()
+    results = await asyncio.gather(*tasks)
+
+    latencies = array("d")
+
+    for result, _ in results:
+        latencies.extend(result)
+
+    return (latencies.tobytes(), min(start for start, _ in times),
+            max(done for _, done in times))
+
+
+def run_load(args):
+    ''' Target of a load process. '''
+
+    return asyncio.run(load(*args))
+
+
+def split(total, parts):
+    ''' Split total into parts that differ by at most one. '''
+
+    return [total // parts + (index < total % parts)
+            for index in range(parts)]
+
+
+def percentile(values, point):
+    ''' Return a percentile of sorted values. '''
+
+    return values[round((len(values) - 1) * point / 100)]
+
+
+def parse_settings(values):
+    ''' Parse section.option=value arguments into a dict of sections. '''
+
+    options = {}
+
+    for value in values:
+        name, _, setting = value.partition("=")
+        section, _, option = name.partition(".")
+
+        if not option or not setting:
+            raise SystemExit(f"--set {value}: use section.option=value")
+
+        options.setdefault(section, {})[option] = setting
+
+    return options
+
+
+def run(args):
+    ''' Run the benchmark, returns a dict of the results. '''
+
+    senders = min(args.senders or args.clients, args.clients)
+    rate = args.rate / senders
+    messages = int(rate * args.duration)
+
+    options = {"server": {"engine": args.engine, "workers": args.workers}}
+
+    for section, values in parse_settings(args.set).items():
+        options.setdefault(section, {}).update(values)
+
+    client_options = {"rate": rate, "messages": messages,
+                      "expected": messages * senders,
+                      "duration": args.duration, "size": args.size,
+                      "legacy": args.legacy}
+
+    processes = min(args.processes, args.clients)
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as directory:
+        port = harness.free_port()
+        server = harness.start_server(__file__, directory, port, options,
+                                      settle=0.5 + 0.5 * args.workers)
+        manager = context.Manager()
+        connected = manager.Semaphore(0)
+        go_flag = manager.Value("b", 0)
+
+        try:
+            # Memory of the server without clients.
+            idle = harness.rss(server.pid)
+
+            with context.Pool(processes) as pool:
+                result = pool.map_async(run_load, [
+                    (port, index, clients, senders_share, client_options,
+                     connected, go_flag)
+                    for index, (clients, senders_share) in enumerate(
+                        zip(split(args.clients, processes),
+                            split(senders, processes)))])
+
+                for _ in range(processes):
+                    connected.acquire()
+
+                # Memory of the server with all clients connected.
+                busy = harness.rss(server.pid)
+                go_flag.value = 1
+                results = result.get(timeout=args.duration + GRACE + 600)
+
+        finally:
+            harness.stop_server(server)
+            manager.shutdown()
+
+    latencies = array("d")
+
+    for data, _, _ in results:
+        latencies.frombytes(data)
+
+    latencies = sorted(latencies)
+    accept_time = (max(done for _, _, done in results) -
+                   min(start for _, start, _ in results))
+
+    report = {
+        "clients": args.clients,
+        "accept_rate": args.clients / accept_time if accept_time else 0,
+        "sent": messages * senders,
+        "expected": messages * senders * args.clients,
+        "delivered": len(latencies),
+        "duration": args.duration,
+        "memory": None,
+        "latency": {},
+    }
+
+    if idle is not None and busy is not None:
+        report["memory"] = (busy - idle) / args.clients
+
+    if latencies:
+        report["latency"] = {point: percentile(latencies, point)
+                             for point in (50, 95, 99)}
+
+    return report
+
+
+def print_report(args, report):
+    ''' Print the results of a benchmark run. '''
+
+    settings = " ".join(args.set)
+    protocol = "legacy" if args.legacy else "framed"
+
+    print(f"engine {args.engine}, {args.workers} worker(s), {protocol}, "
+          f"{args.clients} clients, {args.rate} msg/s for {args.duration} s"
+          f"{', ' + settings if settings else ''}")
+    print(f"  accept rate  {report['accept_rate']:10.0f} clients/s")
+
+    if report["memory"] is not None:
+        print(f"  memory       {report['memory'] / 1024:10.1f} KiB/client")
+    else:
+        print("  memory              n/a")
+
+    print(f"  sent         {report['sent'] / report['duration']:10.0f} msg/s")
+    print(f"  delivered    "
+          f"{report['delivered'] / report['duration']:10.0f} msg/s "
+          f"({report['delivered']} of {report['expected']})")
+
+    for point, value in report["latency"].items():
+        print(f"  p{point:<11} {value * 1000:10.2f} ms")
+
+
+def main():
+    ''' Parse the arguments, run the benchmark and print the report. '''
+
+    if harness.SERVE in sys.argv:
+        harness.serve()
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument("--engine", choices=("threads", "asyncio"),
+                        default="threads")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--senders", type=int, default=10,
+                        help="clients that send messages, 0 for all")
+    parser.add_argument("--rate", type=float, default=100,
+                        help="messages per second of all senders")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--legacy", action="store_true",
+                        help="clients use the original protocol")
+    parser.add_argument("--processes", type=int,
+                        default=min(4, os.cpu_count() or 1),
+                        help="load processes running the clients")
+    parser.add_argument("--set", action="append", default=[],
+                        metavar="SECTION.OPTION=VALUE",
+                        help="a .pcr_server.ini setting of the server")
+    args = parser.parse_args()
+
+    print_report(args, run(args))
+
+
+if __name__ == "__main__":
+    main()
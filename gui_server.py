@@ -10,18 +10,322 @@
 gui_server.py--a grafical user interface (GUI) for the PrivateChatRoom-Server.
 '''
 
+import logging
 import tkinter as tk
 from tkinter import Button
 import tkinter.scrolledtext
 from tkinter import simpledialog
+from tkinter import ttk
 import threading
 import time
+from collections import deque
 from PIL import ImageTk
+from pcr_utils import events
+from pcr_utils import log_buffer
 from pcr_utils import server
+from pcr_utils import server_logging
+from pcr_utils import settings
+from pcr_utils.log_tail import LogTailer
 from pcr_utils.server_logging import server_log
 
 logger = server_log(__name__)
 
+# Most server events applied to the display per update.
+EVENT_BATCH = 500
+
+# Seconds between the updates of the dashboard.
+DASHBOARD_INTERVAL = 1.0
+
+
+class LogView():
+    ''' Shows the lines of the log buffer that pass the level and contain
+        the search text in a text widget. The widget holds at most
+        max_lines lines, the oldest are deleted trim_lines at a time. '''
+
+    def __init__(self, text, buffer, max_lines, trim_lines):
+        self.text = text
+        self.buffer = buffer
+        self.max_lines = max_lines
+        self.trim_lines = max(1, trim_lines)
+        self.level = logging.DEBUG
+        self.search = ""  # Lower case search text.
+        self.lines = 0  # Lines in the widget.
+
+    def append(self, lines):
+        ''' Add new log lines to the buffer and show the ones that match. '''
+
+        shown = [line for level, line in self.buffer.extend(lines)
+                 if log_buffer.matches(level, line, self.level, self.search)]
+
+        if shown:
+            self._insert(shown)
+
+    def show(self, level=None, search=None):
+        ''' Show the matching lines of the buffer again, i.e. after the
+            level or the search text has changed. '''
+
+        if level is not None:
+            self.level = level
+
+        if search is not None:
+            self.search = search.lower()
+
+        self.text.config(state="normal")
+        self.text.delete("1.0", "end")
+        self.lines = 0
+
+        self._insert(self.buffer.select(self.level, self.search))
+
+    def _insert(self, lines):
+        lines = lines[-self.max_lines:]
+
+        # Insert the lines at once.
+        self.text.config(state="normal")
+        self.text.insert("end", chars="".join(lines))
+        self.lines += len(lines)
+
+        # Delete the oldest lines in whole chunks, so it is not done on
+        #   every update.
+        if self.lines > self.max_lines:
+            excess = self.lines - self.max_lines
+            trim = -(-excess // self.trim_lines) * self.trim_lines
+            self.text.delete("1.0", f"{trim + 1}.0")
+            self.lines -= trim
+
+        # Scroll to the bottom of the widget to show the latest log.
+        self.text.yview("end")
+        self.text.config(state="disabled")
+
+
+class Chart():
+    ''' A rolling line chart of the last samples of a value. '''
+
+    def __init__(self, parent, title, unit="", samples=60):
+        self.title = title
+        self.unit = unit
+        self.values = deque(maxlen=samples)
+        self.canvas = tk.Canvas(parent, width=480, height=110, bg="white",
+                                highlightthickness=0)
+
+    def add(self, value):
+        ''' Add a sample and draw the chart again. '''
+
+        self.values.append(value)
+        self.draw()
+
+    def draw(self):
+        ''' Draw the samples scaled to the largest one. '''
+
+        width = int(self.canvas["width"])
+        height = int(self.canvas["height"])
+        top = max(self.values, default=0) or 1
+        step = width / max(1, self.values.maxlen - 1)
+
+        self.canvas.delete("all")
+
+        points = []
+
+        for index, value in enumerate(self.values):
+            points += [index * step, height - 5 - value / top * (height - 25)]
+
+        if len(points) >= 4:
+            self.canvas.create_line(*points, fill="darkgreen", width=2)
+
+        current = self.values[-1] if self.values else 0
+        self.canvas.create_text(
+            5, 3, anchor="nw", font=("Times", 11),
+            text=f"{self.title}: {current:,.1f}{self.unit}   "
+                 f"(max {top:,.1f}{self.unit})")
+
+
+class Dashboard():
+    ''' A panel with rolling charts and counters of the server
+        measurements (server.stats()), updated every DASHBOARD_INTERVAL
+        seconds. '''
+
+    def __init__(self, parent):
+        self.frame = tk.Frame(parent, bg="lightgreen")
+        self.last = None  # The last stats and time.monotonic().
+        self.charts = {
+            "clients": Chart(self.frame, "connected clients"),
+            "messages_in": Chart(self.frame, "messages in", "/s"),
+            "messages_out": Chart(self.frame, "messages out", "/s"),
+            "bytes": Chart(self.frame, "bytes in + out", " B/s"),
+        }
+        self.counters = tk.Label(self.frame, justify="left", anchor="nw",
+                                 font=("Courier", 12), bg="lightgreen")
+
+        for index, chart in enumerate(self.charts.values()):
+            chart.canvas.grid(row=index // 2, column=index % 2, padx=5,
+                              pady=5)
+
+        self.counters.grid(row=2, columnspan=2, sticky="we", padx=5)
+
+    def update(self, stats):
+        ''' Show the new measurements, rates are computed from the
+            difference to the last ones. '''
+
+        now = time.monotonic()
+        rates = {"messages_in": 0.0, "messages_out": 0.0, "bytes": 0.0}
+
+        if self.last is not None:
+            last, last_at = self.last
+            elapsed = max(now - last_at, 1e-3)
+
+            for key in ("messages_in", "messages_out"):
+                rates[key] = max(0, stats[key] - last[key]) / elapsed
+
+            moved = (stats["bytes_in"] + stats["bytes_out"] -
+                     last["bytes_in"] - last["bytes_out"])
+            rates["bytes"] = max(0, moved) / elapsed
+
+        self.last = (stats, now)
+
+        self.charts["clients"].add(stats["clients"])
+
+        for key, value in rates.items():
+            self.charts[key].add(value)
+
+        latency = {key: "   ".join(f"p{point} {value * 1e3:,.1f} ms"
+                                   for point, value in stats[key].items())
+                   for key in ("fanout", "join")}
+        lines = [f"fan-out latency   {latency['fanout'] or '-'}",
+                 f"join latency      {latency['join'] or '-'}",
+                 f"threads {stats['threads']}   "
+                 f"asyncio tasks {stats['tasks']}   "
+                 f"worker processes {stats['workers']}",
+                 "slowest clients (queued messages, bytes, dropped):"]
+        lines += [f"  {alias[:24]:<24} {depth:>6} {nbytes:>10} {dropped:>6}"
+                  for alias, depth, nbytes, dropped in stats["slowest"]]
+
+        self.counters.config(text="\n".join(lines))
+
+
+# Columns of the client table: (name, heading, width), in the order of
+#   server.client_info().
+CLIENT_COLUMNS = (
+    ("alias", "alias", 140),
+    ("ip", "ip", 115),
+    ("mac", "mac", 130),
+    ("connected", "connected", 80),
+    ("messages_in", "msgs in", 70),
+    ("messages_out", "msgs out", 70),
+    ("bytes_in", "bytes in", 85),
+    ("bytes_out", "bytes out", 85),
+    ("queued", "queued", 65),
+    ("active", "last active", 80),
+)
+
+
+class ClientTable():
+    ''' A table of the connected clients, sorted by clicking a heading.
+        Every update compares the rows with the last ones and only
+        changes the rows of clients that have changed. '''
+
+    def __init__(self, parent):
+        self.frame = tk.Frame(parent, bg="lightgreen")
+        self.tree = ttk.Treeview(
+            self.frame, columns=[name for name, _, _ in CLIENT_COLUMNS],
+            show="headings", height=20)
+        self.rows = {}  # Values of the rows by item id.
+        self.keys = {}  # Keys of server.client_rows() by item id.
+        self.sort_column = None
+        self.reverse = False
+
+        for name, heading, width in CLIENT_COLUMNS:
+            self.tree.heading(name, text=heading,
+                              command=lambda name=name: self.sort_by(name))
+            self.tree.column(name, width=width, anchor="w")
+
+        scrollbar = ttk.Scrollbar(self.frame, orient="vertical",
+                                  command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        Button(self.frame, text="kick selected clients",
+               command=self.kick).grid(row=1, column=0, pady=5)
+
+    @staticmethod
+    def display(values):
+        ''' Return the values of a row as they are shown. '''
+
+        values = list(values)
+
+        for index in (3, 9):
+            values[index] = time.strftime("%H:%M:%S",
+                                          time.localtime(values[index]))
+
+        return values
+
+    def update(self, clients):
+        ''' Show the rows of server.client_rows(), returns the number of
+            rows that changed. '''
+
+        changed = 0
+        current = {}
+
+        for key, values in clients.items():
+            # The key of a client of a worker process is (worker, fd).
+            if isinstance(key, tuple):
+                item = "-".join(map(str, key))
+            else:
+                item = str(key)
+
+            current[item] = key
+
+            if self.rows.get(item) == values:
+                continue
+
+            if item in self.rows:
+                self.tree.item(item, values=self.display(values))
+            else:
+                self.tree.insert("", "end", iid=item,
+                                 values=self.display(values))
+
+            self.rows[item] = values
+            changed += 1
+
+        for item in set(self.rows) - set(current):
+            self.tree.delete(item)
+            del self.rows[item]
+            changed += 1
+
+        self.keys = current
+
+        if changed and self.sort_column is not None:
+            self.sort()
+
+        return changed
+
+    def sort_by(self, column):
+        ''' Sort by a column, a second click reverses the order. '''
+
+        if self.sort_column == column:
+            self.reverse = not self.reverse
+        else:
+            self.sort_column, self.reverse = column, False
+
+        self.sort()
+
+    def sort(self):
+        ''' Move the rows that are not in the sorted order. '''
+
+        index = [name for name, _, _ in CLIENT_COLUMNS].index(self.sort_column)
+        order = sorted(self.rows, key=lambda item: self.rows[item][index],
+                       reverse=self.reverse)
+
+        for position, item in enumerate(order):
+            if self.tree.index(item) != position:
+                self.tree.move(item, "", position)
+
+    def kick(self):
+        ''' Disconnect the selected clients. '''
+
+        for item in self.tree.selection():
+            if item in self.keys:
+                server.kick_client(self.keys[item])
+
 
 class GUIServer():
     ''' A class to add a GUI to the server. '''
@@ -33,13 +337,30 @@ class GUIServer():
         self.window = None  # Initialize window to be assigned later.
         self.start_thread = None
         self.server_thread = None
-        self.widget = {"log_text": None,
+
+        # Reads the lines added to the log file since the last update.
+        self.tailer = LogTailer(server_logging.options().get("file"))
+        self.log_view = None
+        self.dashboard = None
+        self.client_table = None
+        self.dashboard_at = 0.0  # time.monotonic() of the last update.
+        self.mac_thread = None  # Looks up the macs of new clients.
+        self.widget = {"notebook": None,
+                       "log_frame": None,
+                       "log_text": None,
+                       "level_menu": None,
+                       "search_entry": None,
                        "image_label": None,
                        "start_button": None,
                        "port_button": None,
                        "stop_button": None,
+                       "status_label": None,
                        "copy_label": None}
 
+        # Live state of the server, kept up to date from its events.
+        self.state = {"count": 0, "messages_in": 0.0, "messages_out": 0.0,
+                      "errors": 0}
+
     def start_server(self):
         ''' Start a new thread which starts the server. '''
 
@@ -60,8 +381,8 @@ class GUIServer():
         # Delete the label containing the image displayed upon startup.
         self.widget["image_label"].destroy()
 
-        # Replace the image label with the log text.
-        self.widget["log_text"].grid(row=0, columnspan=3, padx=40, pady=25)
+        # Replace the image label with the log and the dashboard.
+        self.widget["notebook"].grid(row=0, columnspan=3, padx=40, pady=25)
 
         self.widget["start_button"].config(state="disabled",
                                            text="server started",
@@ -102,21 +423,52 @@ class GUIServer():
         self.update_log(cancel=True)
 
     def read_log(self):
-        ''' Method to read and display the server's log-file. '''
+        ''' Method to display the lines that were added to the server's
+            log-file since the last call. '''
 
-        # Clear the previous text by deleting all of it.
-        self.widget["log_text"].config(state="normal")
-        self.widget["log_text"].delete(1.3, "end")
+        lines = self.tailer.read()
 
-        # Open the server log file in read mode and insert log into
-        #   text widget.
-        with open(".privateChat_server.log", "r", encoding="utf-8") as file:
-            for line in file:
-                self.widget["log_text"].insert("end", chars=line)
+        # Nothing new, leave the widget as it is.
+        if lines:
+            self.log_view.append(lines)
 
-        # Scroll to the bottom of the widget to show the latest log.
-        self.widget["log_text"].yview("end")
-        self.widget["log_text"].config(state="disabled")
+    def filter_log(self, *_):
+        ''' Method that shows the log lines of the selected level that
+            contain the search text. '''
+
+        level = logging.getLevelName(self.widget["level_menu"].get())
+        self.log_view.show(level, self.widget["search_entry"].get())
+
+    def clear_search(self):
+        ''' Method that removes the search text and shows the log lines of
+            the selected level. '''
+
+        self.widget["search_entry"].delete(0, "end")
+        self.filter_log()
+
+    def read_events(self):
+        ''' Method that applies a batch of the server's events to the live
+            state and displays it. '''
+
+        batch = events.drain(EVENT_BATCH)
+
+        if not batch:
+            return
+
+        for event in batch:
+            if event.kind == events.COUNT:
+                self.state["count"] = event.data["count"]
+            elif event.kind == events.THROUGHPUT:
+                self.state["messages_in"] = event.data["messages_in"]
+                self.state["messages_out"] = event.data["messages_out"]
+            elif event.kind == events.ERROR:
+                self.state["errors"] += 1
+
+        self.widget["status_label"].config(
+            text=(f"users online: {self.state['count']}   "
+                  f"messages/s in: {self.state['messages_in']:.1f}   "
+                  f"out: {self.state['messages_out']:.1f}   "
+                  f"warnings/errors: {self.state['errors']}"))
 
     def update_log(self, cancel=False):
         ''' Method that reads the server log and updates the scrolledtext
@@ -125,6 +477,21 @@ class GUIServer():
 
         # Call the read_log methode.
         self.read_log()
+        self.read_events()
+
+        # The dashboard and the client table are updated at a lower rate.
+        now = time.monotonic()
+
+        if now - self.dashboard_at >= DASHBOARD_INTERVAL:
+            self.dashboard_at = now
+            self.dashboard.update(server.stats())
+
+            # Show all clients and look up the macs of new clients in the
+            #   background, a lookup may run a command per client. The macs
+            #   are shown by the next update, worker processes look up
+            #   their own.
+            self.client_table.update(server.client_rows())
+            self.look_up_macs(server.registry.snapshot())
 
         # If cancel is not True, call update_log() again
         #   after 100 milliseconds.
@@ -137,6 +504,19 @@ class GUIServer():
             except ValueError:
                 pass
 
+    def look_up_macs(self, clients):
+        ''' Start a thread that looks up the macs of the clients that were
+            not looked up yet, unless the last one is still running. '''
+
+        if self.mac_thread is not None and self.mac_thread.is_alive():
+            return
+
+        if any(session.mac is None for session in clients):
+            self.mac_thread = threading.Thread(target=server.client_macs,
+                                               name="client macs",
+                                               daemon=True)
+            self.mac_thread.start()
+
     def create_gui(self):
         ''' Method to create a GUI for the server. '''
 
@@ -154,12 +534,50 @@ class GUIServer():
         image = ImageTk.PhotoImage(file="images/pcr_server.png")
         self.widget["image_label"] = tk.Label(frame, image=image)
 
+        # Create tabs for the log and the dashboard.
+        self.widget["notebook"] = ttk.Notebook(frame)
+
+        # Create a frame for the log with a level and search bar.
+        self.widget["log_frame"] = tk.Frame(self.widget["notebook"],
+                                            bg="lightgreen")
+        search_bar = tk.Frame(self.widget["log_frame"], bg="lightgreen")
+
+        self.widget["level_menu"] = tk.StringVar(self.window, value="DEBUG")
+        tk.OptionMenu(search_bar, self.widget["level_menu"],
+                      *log_buffer.LEVELS,
+                      command=self.filter_log).pack(side="left")
+
+        self.widget["search_entry"] = tk.Entry(search_bar, width=40)
+        self.widget["search_entry"].bind("<Return>", self.filter_log)
+        self.widget["search_entry"].pack(side="left", padx=5)
+
+        Button(search_bar, text="search",
+               command=self.filter_log).pack(side="left")
+        Button(search_bar, text="clear",
+               command=self.clear_search).pack(side="left", padx=5)
+
         # Add a scrolled text widget.
         self.widget["log_text"] = tkinter.scrolledtext.ScrolledText(
-                                                                frame,
-                                                                bg='lightgray',
-                                                                font=("Times",
-                                                                      18))
+                                                    self.widget["log_frame"],
+                                                    bg='lightgray',
+                                                    font=("Times", 18))
+
+        search_bar.pack(fill="x", pady=5)
+        self.widget["log_text"].pack(expand=1, fill="both")
+
+        self.dashboard = Dashboard(self.widget["notebook"])
+        self.widget["notebook"].add(self.widget["log_frame"], text="log")
+        self.widget["notebook"].add(self.dashboard.frame, text="dashboard")
+
+        self.client_table = ClientTable(self.widget["notebook"])
+        self.widget["notebook"].add(self.client_table.frame, text="clients")
+
+        # The widget shows a part of the log lines kept in memory.
+        options = settings.config()["gui"]
+        self.log_view = LogView(
+            self.widget["log_text"],
+            log_buffer.LogBuffer(options.getint("buffer_lines")),
+            options.getint("max_lines"), options.getint("trim_lines"))
 
         # Create a button for starting the server.
         self.widget["start_button"] = Button(
@@ -198,6 +616,12 @@ class GUIServer():
                                             relief="sunken",
                                             command=self.stop_server)
 
+        # Create a label to display the live state of the server.
+        self.widget["status_label"] = tkinter.Label(frame,
+                                                    text="",
+                                                    font=("Times", 12),
+                                                    bg="lightgreen")
+
         # Create a label to display the copyright.
         label_text = "Copyright\xa92024 Thomas Pirchmoser"
         self.widget["copy_label"] = tkinter.Label(frame,
@@ -210,7 +634,8 @@ class GUIServer():
         self.widget["start_button"].grid(row=1, column=0, pady=15)
         self.widget["port_button"].grid(row=1, column=1, pady=15)
         self.widget["stop_button"].grid(row=1, column=2, pady=15)
-        self.widget["copy_label"].grid(row=2, column=1, pady=10)
+        self.widget["status_label"].grid(row=2, columnspan=3, pady=5)
+        self.widget["copy_label"].grid(row=3, column=1, pady=10)
 
         frame.pack(expand=1)
 
@@ -272,6 +697,9 @@ def set_ip_port():
 
 
 if __name__ == "__main__":
+    # Let the server publish its events for the display.
+    events.enable()
+
     serve = GUIServer()
     # Call the methode to create the GUI.
     GUIServer.create_gui(serve)
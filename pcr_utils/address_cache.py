@@ -0,0 +1,91 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+address_cache.py--keep the addresses of the machine (public IP, private IP,
+                  mac address) in the .pcr_addresses.json file, so a restart
+                  can use them without looking them up again. Every address
+                  is stored with the time it was looked up and is fresh for
+                  the ttl set in the [discovery] section of the settings.
+'''
+
+import json
+import os
+import tempfile
+import time
+from pcr_utils import settings
+
+# Name of the cache file, read from the working directory like
+#   the .pcr_ip_port.txt file.
+CACHE_FILE = ".pcr_addresses.json"
+
+# The cached addresses and the options of their ttl.
+FIELDS = {
+    "public_ip": "public_ttl",
+    "private_ip": "private_ttl",
+    "mac": "mac_ttl",
+}
+
+
+def write_atomic(path, text):
+    ''' Write text to a file in one go, readers see either the old or the
+        new file but never a partly written one. '''
+
+    directory = os.path.dirname(os.path.abspath(path))
+
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory,
+                                     prefix=".pcr-", delete=False) as file:
+        file.write(text)
+
+    try:
+        os.replace(file.name, path)
+    except OSError:
+        os.unlink(file.name)
+        raise
+
+
+def load(path=CACHE_FILE):
+    ''' Return the cached addresses as a dict of {field: {"value": value,
+        "time": time}}, empty if there is no (valid) cache file. '''
+
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            entries = json.load(file)
+
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(entries, dict):
+        return {}
+
+    return {field: entry for field, entry in entries.items()
+            if field in FIELDS and isinstance(entry, dict) and
+            "value" in entry and "time" in entry}
+
+
+def save(entries, path=CACHE_FILE):
+    ''' Write the cached addresses. '''
+
+    write_atomic(path, json.dumps(entries, indent=2))
+
+
+def is_fresh(entries, field, now=None):
+    ''' Return True if the cached address of a field is younger than its
+        ttl. '''
+
+    entry = entries.get(field)
+
+    if entry is None:
+        return False
+
+    if now is None:
+        now = time.time()
+
+    ttl = settings.config().getfloat("discovery", FIELDS[field])
+
+    return 0 <= now - entry["time"] < ttl
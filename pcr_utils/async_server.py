@@ -0,0 +1,336 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+async_server.py--the asyncio engine of the chat room server. Accepting,
+                 the ALIAS handshake, reading and broadcasting run as
+                 coroutines on one event loop instead of one thread per
+                 client, so one process can hold many thousands of idle
+                 connections. The messages on the wire are the same as with
+                 the threaded engine in server.py.
+                 Start it with server.start("asyncio") or run this module.
+'''
+
+import asyncio
+import functools
+import signal
+import socket
+import time
+from pcr_utils import framing
+from pcr_utils import outbound
+from pcr_utils import server
+from pcr_utils import sessions
+from pcr_utils import settings
+from pcr_utils.server import FORMAT
+from pcr_utils.server_logging import server_log
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = server_log(__name__)
+
+LOOP = None  # Event loop of the running server.
+SERVER = None  # asyncio.Server object of the running server.
+
+# The sessions of the connected clients are kept in server.registry,
+#   broadcasting and presence updates of server.py serve both engines.
+registry = server.registry
+
+
+def raise_fd_limit():
+    ''' Raise the soft limit of open file descriptors to the hard limit,
+        every connected client uses one. '''
+
+    if resource is None:
+        return
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+    if soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError) as err:
+            logger.warning("[LIMIT]: raising the file limit failed %s", err)
+
+
+async def handshake(reader, writer):
+    ''' Send the alias prompt to a new client and receive its alias.
+        Returns a tuple of (alias, frame_reader, pending) like
+        server.handshake(). '''
+
+    writer.write("ALIAS".encode(FORMAT))
+    await writer.drain()
+
+    framed, alias = framing.split_hello(await reader.read(2048))
+
+    if not framed:
+        return alias, None, []
+
+    # The alias of a framed client is its first frame.
+    frame_reader = framing.FrameReader()
+    pending = frame_reader.feed(alias)
+
+    while not pending:
+        data = await reader.read(framing.RECV_SIZE)
+
+        if not data:
+            raise ConnectionResetError("closed during the handshake")
+
+        pending = frame_reader.feed(data)
+
+    # Confirm the framed protocol.
+    writer.write(framing.HELLO)
+
+    return pending[0], frame_reader, pending[1:]
+
+
+async def handle_client(reader, writer):
+    ''' Coroutine that does the ALIAS handshake with a new client and
+        broadcasts its messages until it disconnects. All the frames
+        completed by one read of a framed client are broadcast as a
+        batch. '''
+
+    addr = writer.get_extra_info("peername")
+    accepted_at = time.monotonic()
+    timeout = settings.config().getfloat("server", "handshake_timeout")
+
+    # The server is stopping.
+    if not server.handshakes.add(writer):
+        writer.close()
+        return
+
+    try:
+        # Send the alias prompt to the client and receive their alias.
+        alias, frame_reader, pending = await asyncio.wait_for(
+                                            handshake(reader, writer), timeout)
+
+    except asyncio.TimeoutError:
+        logger.info("[HANDSHAKE]: %s did not send an alias in time",
+                    addr[0])
+        server.handshakes.discard(writer)
+        writer.close()
+        return
+
+    # Cancelled when the event loop is closed during the handshake.
+    except (OSError, framing.FrameError, asyncio.CancelledError):
+        server.handshakes.discard(writer)
+        writer.close()
+        return
+
+    if not alias:
+        server.handshakes.discard(writer)
+        writer.close()
+        return
+
+    # Decode bytes format to string and remove any
+    #   leading/trailing white spaces.
+    msg1 = f"{alias.decode(FORMAT).strip()}"
+
+    session = sessions.Session(writer.get_extra_info("socket"), msg1, addr,
+                               frame_reader is not None, writer)
+
+    # Start a task that writes the messages queued for the client.
+    session.queue = outbound.OutboundQueue(
+                    asyncio.Event(),
+                    on_overflow=functools.partial(server.disconnect_slow,
+                                                  session),
+                    on_over_budget=functools.partial(server.over_budget,
+                                                     session))
+
+    # Add the client to the registry, unless the server has been stopped
+    #   during the handshake.
+    if not server.handshakes.admit(writer, session):
+        writer.close()
+        return
+
+    session.writer = asyncio.create_task(outbound.write_queued_async(session))
+    server.joined(session, accepted_at)
+
+    logger.info("[NEW]: %s %s ip: %s", "new client is", msg1, addr[0])
+
+    # Let all connected clients know that a new user has joined.
+    server.announce_join(msg1)
+
+    # Broadcast messages that a framed client sent with its alias.
+    if pending:
+        server.publish(pending)
+
+    try:
+        while True:
+            if frame_reader is None:
+                data = await reader.read(2048)
+            else:
+                data = await reader.read(framing.RECV_SIZE)
+
+            # An empty message means that the client has closed the app.
+            if not data:
+                break
+
+            if frame_reader is None:
+                messages = (data,)
+            else:
+                messages = frame_reader.feed(data)
+
+                # Wait for the rest of an incomplete frame.
+                if not messages:
+                    continue
+
+            session.received(len(messages), len(data))
+
+            server.publish(messages)
+
+    except framing.FrameError as err:
+        logger.warning("[FRAME]: %s, closing connection", err)
+
+    except OSError:
+        pass
+
+    finally:
+        registry.remove(session)
+        session.queue.close()
+        session.writer.cancel()
+        writer.close()
+
+        logger.info(" %s %s", msg1, "has left the chat...")
+        server.announce_leave(msg1)
+
+
+async def serve(host, port):
+    ''' Listen for incoming connections until the server is closed. '''
+
+    global SERVER
+
+    worker = server.bus is not None
+
+    if worker:
+        # A worker process of worker_pool.py, it shares the port with the
+        #   other workers and is stopped by the main process with SIGTERM.
+        await server.bus.connect()
+        LOOP.add_signal_handler(signal.SIGTERM,
+                                lambda: asyncio.ensure_future(shutdown()))
+
+    # A long backlog absorbs reconnect storms.
+    SERVER = await asyncio.start_server(handle_client, host, port,
+                                        backlog=socket.SOMAXCONN,
+                                        reuse_port=worker or None)
+
+    msg = f" server is listening on {host}:{port}"
+    logger.info(msg)
+
+    async with SERVER:
+        await SERVER.serve_forever()
+
+
+async def shutdown():
+    ''' Let the users know that the server stopped, close their connections
+        and the listening socket. '''
+
+    # Close the connections that have not joined yet, a handshake that
+    #   finishes now does not add its client anymore.
+    for writer in server.handshakes.close_all():
+        writer.close()
+
+    for message in server.STOP_MESSAGES:
+        server.broadcast(message, outbound.CONTROL)
+
+    # Let the writer tasks send the messages that are still waiting.
+    clients = registry.snapshot()
+
+    for session in clients:
+        session.queue.close()
+
+    if clients:
+        await asyncio.wait([session.writer for session in clients],
+                           timeout=2)
+
+    for session in clients:
+        session.stream.close()
+
+    SERVER.close()
+
+
+def start():
+    ''' Start the asyncio server and run it until it is stopped. '''
+
+    global LOOP
+
+    host = server.read_ip()
+
+    # Get port used for the connection.
+    port = server.read_port()
+
+    raise_fd_limit()
+
+    LOOP = asyncio.new_event_loop()
+    asyncio.set_event_loop(LOOP)
+
+    # Flush the presence updates on the event loop.
+    server.presence_updates.schedule = LOOP.call_later
+    logger.info(" server is starting...")
+
+    try:
+        LOOP.run_until_complete(serve(host, port))
+
+    except OSError as error:
+        logger.critical("[BIND]: binding has failed! %s", error)
+        server.log_bind_help(error)
+
+    except asyncio.CancelledError:
+        # serve_forever() gets cancelled when the server is closed.
+        pass
+
+    finally:
+        # Let the client coroutines finish before closing the loop.
+        pending = asyncio.all_tasks(LOOP)
+
+        for task in pending:
+            task.cancel()
+
+        LOOP.run_until_complete(asyncio.gather(*pending,
+                                               return_exceptions=True))
+        LOOP.close()
+        LOOP = None
+
+
+def task_count():
+    ''' Return the number of tasks on the event loop, may be called from
+        any thread. '''
+
+    loop = LOOP
+
+    if loop is None:
+        return 0
+
+    try:
+        return len(asyncio.all_tasks(loop))
+    except RuntimeError:
+        # The tasks changed while they were counted.
+        return 0
+
+
+def stop():
+    ''' Stop the asyncio server, may be called from any thread. '''
+
+    logger.info(" server stopped by user...")
+
+    if LOOP is None or SERVER is None:
+        return
+
+    future = asyncio.run_coroutine_threadsafe(shutdown(), LOOP)
+
+    try:
+        future.result(timeout=5)
+        logger.info(" socket closed...")
+    except Exception as err:
+        logger.warning("[CLOSE]: closing the server has failed %s", err)
+
+
+if __name__ == "__main__":
+    server.start("asyncio")
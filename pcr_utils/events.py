@@ -0,0 +1,132 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+events.py--structured events of the server for the GUI: joins, leaves, user
+           count changes, errors and throughput samples. The server puts
+           them in a bounded in-memory queue that any thread may publish to
+           and the GUI drains it in batches with window.after(), so the GUI
+           does not read the log file back to know what the server does.
+
+           Publishing does nothing until enable() is called, the server
+           without a GUI has no extra work. With more than one worker
+           process (see worker_pool.py) the events of the clients happen
+           in the workers and are not seen by the GUI.
+'''
+
+import collections
+import logging
+import time
+
+# Kinds of events and the data they carry.
+JOIN = "join"  # alias, count
+LEAVE = "leave"  # alias, count
+COUNT = "count"  # count
+ERROR = "error"  # level, name, message
+THROUGHPUT = "throughput"  # clients, messages_in, messages_out, bytes_in,
+#                            bytes_out (per second)
+
+# An event, time is time.time() when it was published.
+Event = collections.namedtuple("Event", ("kind", "time", "data"))
+
+
+class EventQueue():
+    ''' A bounded queue of events, the oldest events are dropped when the
+        reader falls behind. Appending to and popping from a deque is
+        thread-safe, publishing takes no lock. '''
+
+    def __init__(self, maxlen=10000):
+        self._events = collections.deque(maxlen=maxlen)
+        self.enabled = False
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._events)
+
+    def publish(self, kind, **data):
+        ''' Add an event if the queue is enabled. '''
+
+        if not self.enabled:
+            return
+
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+
+        self._events.append(Event(kind, time.time(), data))
+
+    def drain(self, limit=500):
+        ''' Return up to limit of the oldest events and remove them. '''
+
+        drained = []
+
+        try:
+            for _ in range(limit):
+                drained.append(self._events.popleft())
+        except IndexError:
+            pass
+
+        return drained
+
+
+class ErrorHandler(logging.Handler):
+    ''' Publishes the warnings and errors that are logged as events. '''
+
+    def __init__(self, queue, level=logging.WARNING):
+        super().__init__(level)
+        self.queue = queue
+
+    def emit(self, record):
+        try:
+            message = record.getMessage()
+        except (TypeError, ValueError):
+            message = str(record.msg)
+
+        self.queue.publish(ERROR, level=record.levelname, name=record.name,
+                           message=message)
+
+
+# The events of this process.
+stream = EventQueue()
+_ERROR_HANDLER = ErrorHandler(stream)
+
+
+def enable():
+    ''' Start publishing events, the warnings and errors of all loggers
+        are published too. '''
+
+    stream.enabled = True
+
+    # The server loggers propagate their records to the root logger.
+    if _ERROR_HANDLER not in logging.getLogger().handlers:
+        logging.getLogger().addHandler(_ERROR_HANDLER)
+
+
+def disable():
+    ''' Stop publishing events and drop the ones that are waiting. '''
+
+    stream.enabled = False
+    logging.getLogger().removeHandler(_ERROR_HANDLER)
+    stream.drain(len(stream))
+
+
+def enabled():
+    ''' Return True if events are published. '''
+
+    return stream.enabled
+
+
+def publish(kind, **data):
+    ''' Publish an event of the given kind. '''
+
+    stream.publish(kind, **data)
+
+
+def drain(limit=500):
+    ''' Return up to limit events in the order they were published. '''
+
+    return stream.drain(limit)
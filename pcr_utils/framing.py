@@ -0,0 +1,101 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+framing.py--the optional framed protocol of the chat room server.
+
+            Clients that do not ask for it keep the original protocol, where
+            every recv() is treated as one message. A client asks for framing
+            by answering the "ALIAS" prompt with HELLO followed by its alias
+            as a frame. The server answers with HELLO and from then on every
+            message in both directions is a frame: a 4 byte big-endian length
+            followed by that many bytes.
+'''
+
+import struct
+from pcr_utils import settings
+
+# Sent by a client instead of a plain alias to ask for framing, and sent
+#   back by the server to confirm it. The null bytes can not be part of
+#   an alias typed by a user.
+HELLO = b"\x00PCR-FRAMED/1\x00"
+
+HEADER = struct.Struct("!I")  # Length prefix of a frame.
+
+# Number of bytes read from a framed client with one recv().
+RECV_SIZE = 65536
+
+
+class FrameError(ValueError):
+    ''' Raised when a client sends a frame that is too large. '''
+
+
+def encode(payload):
+    ''' Return the payload as a frame. '''
+
+    return HEADER.pack(len(payload)) + payload
+
+
+def split_hello(data):
+    ''' Check the answer to the "ALIAS" prompt, returns a tuple of
+        (framed, data) where data is what follows HELLO for a framed
+        client and the plain alias otherwise. '''
+
+    if data.startswith(HELLO):
+        return True, data[len(HELLO):]
+
+    return False, data
+
+
+class FrameReader():
+    ''' Collect the data received from a framed client and split it
+        into frames. '''
+
+    def __init__(self, max_frame=None):
+        if max_frame is None:
+            max_frame = settings.config().getint("framing", "max_frame")
+
+        self.max_frame = max_frame
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        ''' Add received data and return a list of all the frames that are
+            complete, an incomplete frame stays in the buffer until the rest
+            of it is received. '''
+
+        buffer = self._buffer
+        buffer += data
+
+        frames = []
+        offset = 0
+
+        while len(buffer) - offset >= HEADER.size:
+            (size,) = HEADER.unpack_from(buffer, offset)
+
+            if size > self.max_frame:
+                raise FrameError(f"frame of {size} bytes is too large")
+
+            end = offset + HEADER.size + size
+
+            if end > len(buffer):
+                break
+
+            frames.append((offset + HEADER.size, end))
+            offset = end
+
+        if not frames:
+            return frames
+
+        # Copy each frame out of the buffer once, then remove the complete
+        #   frames from the buffer in one go.
+        with memoryview(buffer) as view:
+            frames = [bytes(view[start:end]) for start, end in frames]
+
+        del buffer[:offset]
+
+        return frames
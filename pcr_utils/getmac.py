@@ -48,7 +48,7 @@ try:
     from typing import TYPE_CHECKING
 
     if TYPE_CHECKING:
-        from typing import Dict, List, Optional, Set, Tuple, Type, Union
+        from typing import Dict, Iterable, List, Optional, Set, Tuple, Type, Union
 except ImportError:
     pass
 
@@ -428,6 +428,39 @@ class ArpFile(Method):
         return None
 
 
+class NetlinkNeigh(Method):
+    """
+    Get the MAC of a remote host from the kernel's neighbor table (ARP for
+    IPv4, NDP for IPv6) with a netlink ``RTM_GETNEIGH`` dump. Nothing is
+    forked, so it's safe to use from a large server process.
+    """
+
+    platforms = {"linux"}
+    method_type = "ip"  # IPv6 and IPv4
+
+    def test(self):  # type: () -> bool
+        from . import netlink
+
+        return netlink.available()
+
+    def get(self, arg):  # type: (str) -> Optional[str]
+        import ipaddress
+
+        from . import netlink
+
+        try:
+            # The kernel reports canonical addresses, e.g. "fe80::1"
+            address = ipaddress.ip_address(arg).compressed
+        except ValueError:
+            return None
+
+        for _, neighbor, mac, _ in netlink.get_neighbors():
+            if neighbor == address:
+                return mac
+
+        return None
+
+
 class ArpFreebsd(Method):
     platforms = {"freebsd"}
     method_type = "ip"
@@ -764,8 +797,11 @@ class FcntlIface(Method):
 
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
-        # 0x8927 = SIOCGIFADDR
-        info = fcntl.ioctl(s.fileno(), 0x8927, struct.pack("256s", arg[:15]))
+        # 0x8927 = SIOCGIFHWADDR
+        try:
+            info = fcntl.ioctl(s.fileno(), 0x8927, struct.pack("256s", arg[:15]))
+        finally:
+            s.close()
 
         if PY2:
             return ":".join(["%02x" % ord(char) for char in info[18:24]])
@@ -1192,6 +1228,32 @@ class DefaultIfaceLinuxRouteFile(Method):
         return None
 
 
+class DefaultIfaceNetlink(Method):
+    """
+    Get the default interface from the kernel's main routing table with a
+    netlink ``RTM_GETROUTE`` dump, without running a command.
+    """
+
+    platforms = {"linux"}
+    method_type = "default_iface"
+
+    def test(self):  # type: () -> bool
+        from . import netlink
+
+        return netlink.available()
+
+    def get(self, arg=""):  # type: (str) -> Optional[str]
+        from . import netlink
+
+        links = netlink.get_links()
+
+        for index, _ in netlink.get_default_routes():
+            if index in links:
+                return links[index][0]
+
+        return None
+
+
 class DefaultIfaceRouteCommand(Method):
     platforms = {"linux", "wsl", "other"}
     method_type = "default_iface"
@@ -1279,6 +1341,7 @@ METHODS = [
     # NOTE: CtypesHost is faster than ArpExe because of sub-process startup times :)
     CtypesHost,
     ArpFile,
+    NetlinkNeigh,
     ArpingHost,
     SysIfaceFile,
     FcntlIface,
@@ -1299,6 +1362,7 @@ METHODS = [
     ArpVariousArgs,
     UuidArpGetNode,
     DefaultIfaceLinuxRouteFile,
+    DefaultIfaceNetlink,
     DefaultIfaceIpRoute,
     DefaultIfaceRouteCommand,
     DefaultIfaceRouteGetCommand,
@@ -1329,6 +1393,22 @@ FALLBACK_CACHE = {
 
 DEFAULT_IFACE = ""  # type: str
 
+# File the method selection of initialize_method_cache() is saved to, so
+# later runs only have to validate the cached method instead of testing all
+# of them. Entries are keyed by platform, PATH and getmac version. Set to an
+# empty string to disable the persistent cache.
+METHOD_CACHE_FILE = ".pcr_getmac_methods.json"  # type: str
+
+# Most fingerprints (platform/PATH combinations) kept in the cache file
+METHOD_CACHE_ENTRIES = 8  # type: int
+
+# Test the candidate methods in parallel threads when the method cache is
+# initialized, so it takes as long as the slowest test instead of all of
+# them together. Tests still running after PROBE_DEADLINE seconds count
+# as failed.
+PARALLEL_PROBES = True  # type: bool
+PROBE_DEADLINE = 5.0  # type: float
+
 
 def get_method_by_name(method_name):
     # type: (str) -> Optional[Type[Method]]
@@ -1395,6 +1475,204 @@ def _warn_critical(err_msg):
     )
 
 
+def _cache_fingerprint(platform):
+    # type: (str) -> str
+    """
+    Identify the platform, PATH, getmac version and available methods the
+    cached method selection is valid for. A different PATH may find
+    different commands.
+    """
+    import hashlib
+
+    methods = ",".join(method.__name__ for method in METHODS)
+    text = "|".join((platform, PATH_STR, __version__, sys.executable, methods))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _read_method_cache_file():
+    # type: () -> Dict[str, Dict[str, Dict[str, object]]]
+    import json
+
+    try:
+        with open(METHOD_CACHE_FILE, "r", encoding="utf-8") as fh:
+            entries = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(entries, dict):
+        return {}
+
+    return entries
+
+
+def _load_method_cache(method_type, network_request, platform):
+    # type: (str, bool, str) -> bool
+    """
+    Restore the method selection for the method type from the cache file.
+
+    Only the cached primary method is validated with its ``test()``, the
+    fallbacks were tested when the selection was saved. Returns False if
+    there is no usable entry, then all methods have to be tested.
+    """
+    if not METHOD_CACHE_FILE:
+        return False
+
+    fingerprint = _cache_fingerprint(platform)
+    entry = _read_method_cache_file().get(fingerprint, {}).get(method_type)
+
+    if not isinstance(entry, dict) or entry.get("network_request") != bool(
+        network_request
+    ):
+        return False
+
+    try:
+        method_class = get_method_by_name(str(entry["method"]))
+        fallback_classes = [
+            get_method_by_name(str(name)) for name in entry["fallback"]
+        ]
+    except (KeyError, TypeError):
+        return False
+
+    if not method_class or not all(fallback_classes):
+        return False
+
+    method_instance = method_class()  # type: Method
+    try:
+        test_result = method_instance.test()  # type: bool
+    except Exception:
+        test_result = False
+
+    if not test_result:
+        log.debug(
+            "Cached method '%s' failed to test, testing all '%s' methods",
+            str(method_instance),
+            method_type,
+        )
+        return False
+
+    METHOD_CACHE[method_type] = method_instance
+    FALLBACK_CACHE[method_type] = [
+        fallback_class() for fallback_class in fallback_classes  # noqa: T484
+    ]
+    log.debug(
+        "Restored '%s' method cache from '%s': %s",
+        method_type,
+        METHOD_CACHE_FILE,
+        str(method_instance),
+    )
+
+    return True
+
+
+def _save_method_cache(method_type, network_request, platform):
+    # type: (str, bool, str) -> None
+    """
+    Save the method selection for the method type to the cache file,
+    written to a temporary file first and then moved over the old one.
+    """
+    if not METHOD_CACHE_FILE or not METHOD_CACHE[method_type]:
+        return
+
+    import json
+    import tempfile
+
+    fingerprint = _cache_fingerprint(platform)
+    entries = _read_method_cache_file()
+
+    # The latest fingerprint is moved to the end, the oldest ones dropped.
+    entry = entries.pop(fingerprint, {})
+    if not isinstance(entry, dict):
+        entry = {}
+    entry[method_type] = {
+        "method": str(METHOD_CACHE[method_type]),
+        "fallback": [str(f_meth) for f_meth in FALLBACK_CACHE[method_type]],
+        "network_request": bool(network_request),
+    }
+    entries[fingerprint] = entry
+
+    while len(entries) > METHOD_CACHE_ENTRIES:
+        del entries[next(iter(entries))]
+
+    directory = os.path.dirname(os.path.abspath(METHOD_CACHE_FILE))
+
+    try:
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=directory, prefix=".getmac-", delete=False
+        ) as fh:
+            json.dump(entries, fh, indent=2)
+        os.replace(fh.name, METHOD_CACHE_FILE)
+    except OSError as ex:
+        log.debug("Could not save the method cache to '%s': %s", METHOD_CACHE_FILE, ex)
+        try:
+            os.unlink(fh.name)
+        except (OSError, NameError):
+            pass
+
+
+def _test_method(method_instance):
+    # type: (Method) -> bool
+    try:
+        return bool(method_instance.test())
+    except Exception:
+        return False
+
+
+def _probe_methods(method_classes):
+    # type: (List[Type[Method]]) -> List[Method]
+    """
+    Test the methods and return the instances of the ones that passed,
+    in the order of ``method_classes`` (the priority order).
+
+    With ``PARALLEL_PROBES`` every test runs in its own daemon thread,
+    tests that have not finished after ``PROBE_DEADLINE`` seconds are
+    treated as failed and left running in the background.
+    """
+    instances = [method_class() for method_class in method_classes]
+
+    if not PARALLEL_PROBES or len(instances) < 2:
+        results = [_test_method(instance) for instance in instances]
+    else:
+        import threading
+        import time
+
+        results = [None] * len(instances)  # type: List[Optional[bool]]
+
+        def run(index, instance):
+            # type: (int, Method) -> None
+            results[index] = _test_method(instance)
+
+        threads = [
+            threading.Thread(
+                target=run, args=(index, instance), name="getmac-probe", daemon=True
+            )
+            for index, instance in enumerate(instances)
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        deadline = time.monotonic() + PROBE_DEADLINE
+
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    tested = []  # type: List[Method]
+
+    for instance, result in zip(instances, results):
+        if result:
+            tested.append(instance)
+        elif result is None:
+            log.debug(
+                "Test for method '%s' did not finish within %s seconds",
+                str(instance),
+                PROBE_DEADLINE,
+            )
+        elif DEBUG:
+            log.debug("Test failed for method '%s'", str(instance))
+
+    return tested
+
+
 def initialize_method_cache(
     method_type, network_request=True
 ):  # type: (str, bool) -> bool
@@ -1427,6 +1705,11 @@ def initialize_method_cache(
     else:
         platform = PLATFORM
 
+    # A method selection saved by an earlier run only needs its primary
+    # method validated instead of testing every method.
+    if _load_method_cache(method_type, network_request, platform):
+        return True
+
     if DEBUG >= 4:
         meth_strs = ", ".join(m.__name__ for m in METHODS)  # type: str
         log.debug("%d methods available: %s", len(METHODS), meth_strs)
@@ -1496,21 +1779,11 @@ def initialize_method_cache(
         filtered_methods = [m for m in platform_methods if not m.network_request]
 
     # Determine which methods work on the current system
-    tested_methods = []  # type: List[Method]
+    tested_methods = _probe_methods(filtered_methods)  # type: List[Method]
 
-    for method_class in filtered_methods:
-        method_instance = method_class()  # type: Method
-        try:
-            test_result = method_instance.test()  # type: bool
-        except Exception:
-            test_result = False
-        if test_result:
-            tested_methods.append(method_instance)
-            # First successful test goes in the cache
-            if not METHOD_CACHE[method_type]:
-                METHOD_CACHE[method_type] = method_instance
-        elif DEBUG:
-            log.debug("Test failed for method '%s'", str(method_instance))
+    # First successful test in priority order goes in the cache
+    if tested_methods and not METHOD_CACHE[method_type]:
+        METHOD_CACHE[method_type] = tested_methods[0]
 
     if not tested_methods:
         _warn_critical(
@@ -1544,6 +1817,8 @@ def initialize_method_cache(
         )
     log.debug("Finished initializing '%s' method cache", method_type)
 
+    _save_method_cache(method_type, network_request, platform)
+
     return True
 
 
@@ -1793,11 +2068,14 @@ def get_mac_address(  # noqa: C901
             if not METHOD_CACHE["ip4"]:
                 initialize_method_cache("ip4", network_request)
 
-            # If ArpFile succeeds, just use that, since it's
-            # significantly faster than arping (file read vs.
-            # spawning a process).
-            if not FORCE_METHOD or FORCE_METHOD.lower() == "arpfile":
-                af_meth = get_instance_from_cache("ip4", "ArpFile")
+            # If ArpFile or NetlinkNeigh succeed, just use that, since
+            # they're significantly faster than arping (file read or
+            # netlink request vs. spawning a process).
+            for table_meth in ["ArpFile", "NetlinkNeigh"]:
+                if mac or (FORCE_METHOD and FORCE_METHOD.lower() != table_meth.lower()):
+                    continue
+
+                af_meth = get_instance_from_cache("ip4", table_meth)
                 if af_meth:
                     mac = _attempt_method_get(af_meth, "ip4", ip)
 
@@ -1899,3 +2177,117 @@ def get_mac_address(  # noqa: C901
         log.debug("getmac took %.4f seconds", duration)
 
     return _clean_mac(mac)
+
+
+def _canonical_ip(ip):
+    # type: (str) -> Optional[str]
+    """Return the canonical form of an IPv4 or IPv6 address, or None if invalid."""
+    import ipaddress
+
+    try:
+        return ipaddress.ip_address(ip).compressed
+    except ValueError:
+        return None
+
+
+def get_neighbor_table():
+    # type: () -> Optional[Dict[str, str]]
+    """
+    Read the whole neighbor table (ARP for IPv4, NDP for IPv6) of the system
+    at once, without running a command.
+
+    Uses a netlink ``RTM_GETNEIGH`` dump on Linux, and ``/proc/net/arp``
+    (IPv4 only) if netlink isn't usable.
+
+    Returns:
+        Dict of canonical IP address to lowercase colon-separated MAC address,
+        or :obj:`None` if the table can't be read in one pass on this platform.
+    """
+    if not LINUX:
+        return None
+
+    from . import netlink
+
+    if netlink.available():
+        try:
+            return {ip: mac for _, ip, mac, _ in netlink.get_neighbors()}
+        except OSError as ex:
+            log.debug("Netlink neighbor dump failed: %s", ex)
+
+    data = _read_file(ArpFile._path)
+    if data is None:
+        return None
+
+    table = {}  # type: Dict[str, str]
+    # IP address, HW type, Flags, HW address, Mask, Device
+    for line in data.splitlines()[1:]:
+        fields = line.split()
+        # Flags 0x0 are incomplete entries without a MAC
+        if len(fields) >= 4 and fields[2] != "0x0":
+            table[fields[0]] = _clean_mac(fields[3])  # type: ignore
+
+    return table
+
+
+def get_mac_addresses(ips, network_request=False):
+    # type: (Iterable[str], bool) -> Dict[str, Optional[str]]
+    """
+    Get the MAC addresses of many remote hosts, reading the neighbor table
+    once instead of once per address (see :func:`get_neighbor_table`).
+
+    Platforms where the table can't be read in one pass fall back to
+    :func:`get_mac_address` for each address.
+
+    Args:
+        ips (iterable of str): IPv4 and/or IPv6 addresses of remote hosts
+        network_request (bool): If a UDP packet should be sent to the hosts
+            that aren't in the table, which is then read once more. The port
+            is the module variable ``getmac.PORT``.
+
+    Returns:
+        Dict of each address as given to its MAC address, or :obj:`None`
+        for addresses that could not be found.
+    """
+    ips = list(dict.fromkeys(ips))
+    results = {}  # type: Dict[str, Optional[str]]
+    table = get_neighbor_table()
+
+    if table is None:
+        for ip in ips:
+            if ":" in ip:
+                results[ip] = get_mac_address(ip6=ip, network_request=network_request)
+            else:
+                results[ip] = get_mac_address(ip=ip, network_request=network_request)
+        return results
+
+    canonical = {ip: _canonical_ip(ip) for ip in ips}
+    missing = [
+        ip
+        for ip in ips
+        if canonical[ip] not in table and canonical[ip] not in ("127.0.0.1", "::1")
+    ]
+
+    # Populate the ARP/NDP table for all missing hosts, then read it again
+    if network_request and missing:
+        for ip in missing:
+            if canonical[ip] is None:
+                continue
+
+            family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            try:
+                sock.sendto(b"", (ip, PORT))
+            except Exception:
+                log.error("Failed to send ARP table population packet to %s", ip)
+            finally:
+                sock.close()
+
+        table = get_neighbor_table() or table
+
+    for ip in ips:
+        if canonical[ip] in ("127.0.0.1", "::1"):
+            results[ip] = "00:00:00:00:00:00"
+        else:
+            results[ip] = table.get(canonical[ip])  # type: ignore
+
+    return results
@@ -0,0 +1,233 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+interfaces.py--the IPv4 and IPv6 addresses of the network interfaces of the
+               machine, read from the kernel without a DNS lookup. Linux uses
+               netlink (see netlink.py) with a fallback to the SIOCGIFCONF
+               ioctl (IPv4 only), other systems resolve the host name.
+
+               The addresses are cached. On Linux a background thread listens
+               for netlink notifications and drops the cache when interfaces
+               or addresses change, so it is read again on the next call.
+'''
+
+import collections
+import ipaddress
+import socket
+import struct
+import sys
+import threading
+from pcr_utils import netlink
+from pcr_utils.server_logging import server_log
+
+logger = server_log(__name__)
+
+# An address of an interface.
+Address = collections.namedtuple(
+    "Address", ("interface", "family", "address", "prefix", "loopback"))
+
+SIOCGIFCONF = 0x8912  # Linux ioctl that lists the IPv4 interfaces.
+
+# Size of struct ifreq, 40 bytes on 64 bit and 32 bytes on 32 bit systems.
+IFREQ_SIZE = 40 if struct.calcsize("P") == 8 else 32
+IFNAMSIZ = 16
+
+_CACHE = {}  # Cached "addresses" and "default" (interface of the route).
+_LOCK = threading.Lock()
+_WATCHER = None
+
+
+def from_netlink():
+    ''' Return the addresses and the interface of the default route read
+        with netlink. '''
+
+    links = netlink.get_links()
+    found = []
+
+    for index, family, address, prefix, _, label in netlink.get_addresses():
+        name, flags, _ = links.get(index, (label, 0, None))
+
+        # Leave out interfaces that are down.
+        if not flags & netlink.IFF_UP:
+            continue
+
+        found.append(Address(name or label, family, address, prefix,
+                             bool(flags & netlink.IFF_LOOPBACK)))
+
+    default = None
+
+    for index, _ in netlink.get_default_routes():
+        if index in links:
+            default = links[index][0]
+            break
+
+    return found, default
+
+
+def from_ioctl():
+    ''' Return the IPv4 addresses read with the SIOCGIFCONF ioctl. '''
+
+    import array
+    import fcntl
+
+    size = IFREQ_SIZE * 64
+    names = array.array("B", bytes(size))
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        request = struct.pack("iL", size, names.buffer_info()[0])
+        answer = fcntl.ioctl(sock.fileno(), SIOCGIFCONF, request)
+
+    length = struct.unpack("iL", answer)[0]
+    data = names.tobytes()
+    found = []
+
+    for offset in range(0, length, IFREQ_SIZE):
+        name = data[offset:offset + IFNAMSIZ].split(b"\x00", 1)[0].decode()
+
+        # struct sockaddr_in follows the name: family, port, address.
+        address = socket.inet_ntoa(
+            data[offset + IFNAMSIZ + 4:offset + IFNAMSIZ + 8])
+        found.append(Address(name, socket.AF_INET, address, None,
+                             ipaddress.ip_address(address).is_loopback))
+
+    return found, None
+
+
+def from_hostname():
+    ''' Return the addresses of the host name, the last resort. '''
+
+    found = []
+
+    try:
+        infos = socket.getaddrinfo(socket.gethostname(), None)
+    except OSError:
+        return found, None
+
+    for family, _, _, _, sockaddr in infos:
+        address = Address("", family, sockaddr[0], None,
+                          ipaddress.ip_address(sockaddr[0]).is_loopback)
+
+        if address not in found:
+            found.append(address)
+
+    return found, None
+
+
+def read():
+    ''' Read the addresses from the kernel, returns (addresses, interface
+        of the default route). '''
+
+    if sys.platform.startswith("linux"):
+        if netlink.available():
+            try:
+                return from_netlink()
+            except OSError as err:
+                logger.debug("[INTERFACES]: netlink failed! %s", err)
+
+        try:
+            return from_ioctl()
+        except OSError as err:
+            logger.debug("[INTERFACES]: SIOCGIFCONF failed! %s", err)
+
+    return from_hostname()
+
+
+def watch(monitor):
+    ''' Thread target that drops the cache whenever the kernel reports a
+        change of the interfaces, addresses or routes to monitor. If the
+        socket fails the cache is dropped for good, the next call reads the
+        addresses again and starts a new watcher. '''
+
+    global _WATCHER
+
+    while True:
+        try:
+            changes = monitor.wait()
+        except OSError:
+            break
+
+        if changes:
+            invalidate()
+
+    monitor.close()
+
+    with _LOCK:
+        _WATCHER = None
+        _CACHE.clear()
+
+
+def invalidate():
+    ''' Drop the cached addresses. '''
+
+    with _LOCK:
+        _CACHE.clear()
+
+
+def _cached():
+    global _WATCHER
+
+    with _LOCK:
+        if not _CACHE:
+            # Listen before reading, so no change between the two is
+            #   missed.
+            if _WATCHER is None and netlink.available():
+                try:
+                    monitor = netlink.Monitor()
+                except OSError as err:
+                    logger.debug("[INTERFACES]: can not watch for changes! %s",
+                                 err)
+                else:
+                    _WATCHER = threading.Thread(target=watch,
+                                                args=(monitor,),
+                                                name="interfaces",
+                                                daemon=True)
+                    _WATCHER.start()
+
+            _CACHE["addresses"], _CACHE["default"] = read()
+
+            # Without a watcher every call reads the addresses again.
+            if _WATCHER is None:
+                addresses, default = _CACHE["addresses"], _CACHE["default"]
+                _CACHE.clear()
+                return addresses, default
+
+        return _CACHE["addresses"], _CACHE["default"]
+
+
+def addresses(family=None):
+    ''' Return the addresses of the interfaces that are up, only the ones
+        of family (i.e. socket.AF_INET) if given. '''
+
+    found, _ = _cached()
+
+    if family is None:
+        return list(found)
+
+    return [address for address in found if address.family == family]
+
+
+def primary_ipv4():
+    ''' Return the IPv4 address the server should listen on to be reached
+        from the local network: the address of the interface with the
+        default route, else the first address that is not a loopback.
+        Returns None if there is only the loopback. '''
+
+    found, default = _cached()
+    candidates = [address for address in found
+                  if address.family == socket.AF_INET and
+                  not address.loopback]
+
+    for address in candidates:
+        if address.interface == default:
+            return address.address
+
+    if candidates:
+        return candidates[0].address
+
+    return None
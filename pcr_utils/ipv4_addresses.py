@@ -7,81 +7,161 @@
 #   be used for commercial or profit purposes.
 
 '''
-public_ip.py--a module that utilizes the ipinfo API to get your public
-IP address and print it out. If there are any issues with the HTTP requests
-(like no internet connection), it will catch these errors and print them out,
-instead of crashing the program.
+ipv4_addresses.py--a module that gets your public IP address (see
+public_ip.py), private IP address and mac address and prints them out. If
+there are any issues with the lookups (like no internet connection), it will
+log them instead of crashing the program.
+The addresses are cached (see address_cache.py), so a restart only looks up
+the ones that are older than their ttl.
 '''
 
 
 import socket
-import requests
-from pcr_utils import getmac
+import threading
+import time
+from pcr_utils import address_cache
+from pcr_utils import interfaces
+from pcr_utils import public_ip
 from pcr_utils.server_logging import server_log
 
 logger = server_log(__name__)
 
+# Text file with the addresses for the user, written after every lookup.
+ADDRESSES_FILE = ".pcr_addresses.txt"
 
-def get_public():
-    ''' Function that gets the public IPv4 address of a device. '''
-    try:
-        endpoint = "https://ipinfo.io/json"  # Set up the API endpoint.
 
-        # Send an HTTP request to the API and store the result.
-        response = requests.get(endpoint, verify=True, timeout=3)
+def get_public(resolver=None):
+    ''' Function that gets the public IPv4 address of a device.
+        resolver() returns the address or None, the default asks the
+        providers of the [discovery] settings (see public_ip.py). '''
 
-        # If the status code is not 200 (request was unsuccessful),
-        #   log the status code.
-        if response.status_code != 200:
-            logger.error("Status: %s.",  response.status_code)
-            return None
+    if resolver is None:
+        resolver = public_ip.default_resolver()
 
-        data = response.json()  # Load the JSON data from the HTTP response.
+    ip_addr = resolver()
 
-        # Log the received IP
-        logger.info(" your public IPv4 address: %s", data['ip'])
-
-        with open(".pcr_addresses.txt", 'w+', encoding="utf-8") as file:
-            file.write(f"public_ipv4: {data['ip']}\n")
-
-        get_mac()
+    if ip_addr is None:
+        logger.warning(" check internet connection!")
+        return None
 
-        return data['ip']  # Return the public IPv4 address.
+    # Log the received IP
+    logger.info(" your public IPv4 address: %s", ip_addr)
 
-    except requests.exceptions.RequestException:
-        # If any error occurs during the request,
-        #   log a message and return None.
+    return ip_addr
 
-        with open(".pcr_addresses.txt", 'w+', encoding="utf-8") as file:
-            file.write("Public_ip4: check internet connection!\n")
 
-        logger.warning(" check internet connection!")
-        return None
+def get_private():
+    ''' Function that gets the private IPv4 address, the address of the
+        interface with the default route (see interfaces.py). '''
+    ip_addr = interfaces.primary_ipv4()
 
+    # Only the loopback was found, ask for the address of the host name.
+    if ip_addr is None:
+        hostname = socket.gethostname()
+        ip_addr = socket.gethostbyname(hostname)
 
-def get_private():
-    ''' Function that gets the private IPv4 address. '''
-    hostname = socket.gethostname()
-    ip_addr = socket.gethostbyname(hostname)
     logger.info(" your private IPv4 address: %s", ip_addr)
 
-    with open(".pcr_addresses.txt", 'a+', encoding="utf-8") as file:
-        file.write(f"private_ipv4: {ip_addr}\n")
-
     return ip_addr   # Return private IPv4 address.
 
 
 def get_mac():
-    ''' Function to log mac address. '''
+    ''' Function to log the mac address and the mac address of the
+        default gateway. '''
+    from pcr_utils import getmac
+    from pcr_utils import neighbors
+
     mac = getmac.get_mac_address()
     logger.info(" your mac address: %s", mac)
 
-    with open(".pcr_addresses.txt", 'a+', encoding="utf-8") as file:
-        file.write(f"device_mac: {mac}\n")
+    gateway = neighbors.gateway_mac()
+
+    if gateway is not None:
+        logger.info(" your gateway mac address: %s", gateway)
 
     return mac
 
 
+def write_addresses(entries):
+    ''' Write the addresses to the .pcr_addresses.txt file in one go. '''
+
+    def value(field):
+        entry = entries.get(field)
+        return entry["value"] if entry else None
+
+    public_ip = value("public_ip")
+
+    if public_ip is None:
+        lines = ["Public_ip4: check internet connection!"]
+    else:
+        lines = [f"public_ipv4: {public_ip}"]
+
+    lines.append(f"private_ipv4: {value('private_ip')}")
+    lines.append(f"device_mac: {value('mac')}")
+
+    address_cache.write_atomic(ADDRESSES_FILE, "\n".join(lines) + "\n")
+
+
+def discover(on_public=None, on_private=None, resolver=None):
+    ''' Get the public and private IPv4 address and the mac address,
+        so the server does not wait for them. The addresses in the cache
+        are passed to on_public(ip) and on_private(ip) right away, the
+        ones that are missing or older than their ttl are looked up in a
+        background thread and passed on once they are known. Returns the
+        thread or None if every cached address is fresh. resolver is
+        passed to get_public(). '''
+
+    entries = address_cache.load()
+    callbacks = {"public_ip": on_public, "private_ip": on_private}
+    lookups = {
+        "public_ip": lambda: get_public(resolver),
+        "private_ip": get_private,
+        "mac": get_mac,
+    }
+
+    for field, entry in entries.items():
+        logger.info(" cached %s: %s", field, entry["value"])
+
+        if callbacks.get(field) is not None:
+            callbacks[field](entry["value"])
+
+    stale = [field for field in lookups
+             if not address_cache.is_fresh(entries, field)]
+
+    if not stale:
+        logger.debug("[ADDRESSES]: %s", "using the cached addresses")
+        return None
+
+    def run():
+        for field in stale:
+            value = lookups[field]()
+
+            # A failed lookup keeps the last known address.
+            if value is None:
+                continue
+
+            entries[field] = {"value": value, "time": time.time()}
+
+            if callbacks.get(field) is not None:
+                callbacks[field](value)
+
+        try:
+            address_cache.save(entries)
+            write_addresses(entries)
+
+        except OSError as err:
+            logger.warning("[ADDRESSES]: saving the addresses failed! %s",
+                           err)
+
+    thread = threading.Thread(target=run, name="address-discovery",
+                              daemon=True)
+    thread.start()
+
+    return thread
+
+
 if __name__ == "__main__":
-    get_public()
-    get_private()
+    discovery = discover()
+
+    if discovery is not None:
+        discovery.join()
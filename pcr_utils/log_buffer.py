@@ -0,0 +1,85 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+log_buffer.py--the most recent lines of the log in memory, a ring buffer
+               that drops the oldest lines once it is full. The GUI filters
+               and searches the buffer by level and text instead of its
+               text widget, so the widget only holds the lines it shows.
+'''
+
+import logging
+from collections import deque
+
+# Levels that can be selected, the lowest first.
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+
+def line_level(line):
+    ''' Return the logging level of a log line, None if the line is not
+        the start of a record (i.e. a line of a traceback). The lines look
+        like "2024-01-31 12:00:00:INFO:name:message". '''
+
+    parts = line.split(":", 4)
+
+    if len(parts) == 5 and parts[3] in LEVELS:
+        return logging.getLevelName(parts[3])
+
+    return None
+
+
+class LogBuffer():
+    ''' The last maxlen log lines with their levels, lines without a level
+        get the level of the record they belong to. '''
+
+    def __init__(self, maxlen=5000):
+        self._lines = deque(maxlen=maxlen)
+        self._level = logging.INFO
+
+    def __len__(self):
+        return len(self._lines)
+
+    def extend(self, lines):
+        ''' Add lines, returns them as a list of (level, line). '''
+
+        added = []
+
+        for line in lines:
+            level = line_level(line)
+
+            if level is None:
+                level = self._level
+            else:
+                self._level = level
+
+            added.append((level, line))
+
+        self._lines.extend(added)
+
+        return added
+
+    def select(self, level=logging.DEBUG, text=""):
+        ''' Return the lines of level and above that contain text (case
+            insensitive). '''
+
+        text = text.lower()
+
+        return [line for entry_level, line in self._lines
+                if matches(entry_level, line, level, text)]
+
+    def clear(self):
+        ''' Remove all lines. '''
+
+        self._lines.clear()
+
+
+def matches(entry_level, line, level, text):
+    ''' Return True if a line of entry_level passes the level and contains
+        the lower case search text. '''
+
+    return entry_level >= level and (not text or text in line.lower())
@@ -0,0 +1,97 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+log_tail.py--read the lines that were added to the log file since the last
+             read, like "tail -f". The tailer remembers the offset and the
+             inode of the file, so it only reads new bytes and notices when
+             the RotatingFileHandler has renamed the file to ".1" and
+             started a new one. The rest of the old file is read first, no
+             line is lost.
+
+             The file is opened for every read and not kept open, otherwise
+             Windows could not rename it when it is rotated.
+'''
+
+import os
+
+
+class LogTailer():
+    ''' Returns the new lines of a log file. At most max_bytes are read per
+        call, the rest is returned by the next calls. '''
+
+    def __init__(self, path, max_bytes=262144):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.inode = None  # Inode of the file that is being read.
+        self.offset = 0
+        self._partial = b""  # The end of a line that is still written.
+
+    def _read(self, path, budget):
+        ''' Return up to budget bytes of path from the offset. '''
+
+        with open(path, "rb") as file:
+            file.seek(self.offset)
+            data = file.read(budget)
+
+        self.offset += len(data)
+
+        return data
+
+    def _rotated(self, inode):
+        ''' Return the rest of the file that was rotated away from inode,
+            b"" if it was not found (i.e. deleted). '''
+
+        old = f"{self.path}.1"
+
+        try:
+            if os.stat(old).st_ino == inode:
+                return self._read(old, self.max_bytes)
+        except OSError:
+            pass
+
+        return b""
+
+    def read(self):
+        ''' Return the list of complete lines added since the last call. '''
+
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return []
+
+        data = b""
+
+        if self.inode is not None and stat.st_ino != self.inode:
+            data = self._rotated(self.inode)
+
+            # Go on with the new file once the old one has been read.
+            if len(data) < self.max_bytes:
+                self.inode = stat.st_ino
+                self.offset = 0
+
+        elif stat.st_size < self.offset:
+            # Truncated, start at the beginning.
+            self.offset = 0
+
+        if self.inode is None:
+            self.inode = stat.st_ino
+
+        if self.inode == stat.st_ino and len(data) < self.max_bytes:
+            try:
+                data += self._read(self.path, self.max_bytes - len(data))
+            except OSError:
+                pass
+
+        if not data:
+            return []
+
+        *lines, self._partial = (self._partial + data).split(b"\n")
+
+        return [line.decode("utf-8", errors="replace") + "\n"
+                for line in lines]
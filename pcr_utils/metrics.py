@@ -0,0 +1,54 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+metrics.py--performance measurements of the server, kept in memory.
+'''
+
+import threading
+from collections import deque
+
+
+class Samples():
+    ''' The most recent samples of a measurement (i.e. latencies in
+        seconds) with their percentiles. '''
+
+    def __init__(self, size=1024):
+        self._values = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def add(self, value):
+        ''' Add a sample, the oldest sample is dropped once full. '''
+
+        with self._lock:
+            self._values.append(value)
+
+    def percentiles(self, points=(50, 95, 99)):
+        ''' Return a dict of the given percentiles of the samples, empty if
+            there are no samples yet. '''
+
+        with self._lock:
+            values = sorted(self._values)
+
+        if not values:
+            return {}
+
+        last = len(values) - 1
+
+        return {point: values[round(last * point / 100)] for point in points}
+
+
+# Time from accepting a connection until the client has joined the chat.
+join_latency = Samples()
+
+# Time from broadcasting a message until a writer has sent it to a client,
+#   for the oldest message of each batch that is sent.
+fanout_latency = Samples()
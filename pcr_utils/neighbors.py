@@ -0,0 +1,233 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+neighbors.py--the mac addresses of the hosts on the local network, from the
+              neighbor table (ARP for IPv4, NDP for IPv6). The table is read
+              once and kept in memory, so looking up all connected clients
+              is one dictionary lookup each.
+
+              On Linux a background thread applies the netlink notifications
+              of new, changed and removed neighbors to the cached table.
+              Where the table can not be read at once, the addresses are
+              looked up one by one with getmac. The macs of those lookups,
+              and the addresses that were not found, are kept for
+              neighbor_ttl seconds ([discovery] in the settings), as is a
+              table that is not watched.
+'''
+
+import ipaddress
+import threading
+import time
+from pcr_utils import getmac
+from pcr_utils import netlink
+from pcr_utils import settings
+from pcr_utils.server_logging import server_log
+
+logger = server_log(__name__)
+
+# Addresses of the machine itself, they are not in the neighbor table.
+LOOPBACK_MAC = "00:00:00:00:00:00"
+
+
+def canonical(ip_addr):
+    ''' Return the address the way the kernel reports it (i.e. "fe80::1")
+        or None if it is not an IP address. '''
+
+    try:
+        return ipaddress.ip_address(ip_addr).compressed
+    except ValueError:
+        return None
+
+
+class NeighborCache():
+    ''' The neighbor table as {address: mac}. lookup() reads it on the
+        first call and again when it is stale, a full read is skipped while
+        the netlink watcher keeps it up to date. '''
+
+    def __init__(self, ttl=None):
+        if ttl is None:
+            ttl = settings.config().getfloat("discovery", "neighbor_ttl")
+
+        self.ttl = ttl
+        self._table = None  # None until read or if it can not be read.
+        self._read_at = None  # time.monotonic() of the last full read.
+        self._monitor = None
+        self._lock = threading.Lock()
+
+        # {address: (mac, time.monotonic())} of the single lookups where
+        #   the table can not be read, mac is None if it was not found.
+        self._hosts = {}
+
+    def __len__(self):
+        return len(self._table or ())
+
+    def _stale(self, now):
+        if self._read_at is None:
+            return True
+
+        # The watcher applies every change, no need to read it again.
+        if self._monitor is not None:
+            return False
+
+        return now - self._read_at >= self.ttl
+
+    def refresh(self):
+        ''' Read the whole neighbor table. '''
+
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        # Listen before reading, so no change between the two is missed.
+        if self._monitor is None and netlink.available():
+            try:
+                self._monitor = netlink.Monitor(netlink.RTMGRP_NEIGH)
+            except OSError as err:
+                logger.debug("[NEIGHBORS]: can not watch for changes! %s",
+                             err)
+            else:
+                threading.Thread(target=self._watch, args=(self._monitor,),
+                                 name="neighbors", daemon=True).start()
+
+        self._table = getmac.get_neighbor_table()
+        self._read_at = time.monotonic()
+
+        logger.debug("[NEIGHBORS]: read %s entries", len(self))
+
+    def _watch(self, monitor):
+        ''' Thread target that applies the neighbor notifications to the
+            table until the socket fails (i.e. the kernel dropped
+            notifications), then the next lookup reads it again. '''
+
+        while True:
+            try:
+                changes = monitor.receive()
+            except OSError:
+                break
+
+            with self._lock:
+                if self._table is None:
+                    continue
+
+                for kind, body in changes:
+                    neighbor = netlink.parse_neighbor(body)
+
+                    if neighbor is None:
+                        continue
+
+                    _, address, mac, _ = neighbor
+
+                    if kind == netlink.RTM_NEWNEIGH and mac is not None:
+                        self._table[address] = mac
+                    elif kind in (netlink.RTM_NEWNEIGH, netlink.RTM_DELNEIGH):
+                        self._table.pop(address, None)
+
+        with self._lock:
+            monitor.close()
+
+            if self._monitor is monitor:
+                self._monitor = None
+                self._read_at = None
+
+    def lookup(self, addresses):
+        ''' Return {address: mac} of the given IPv4 and IPv6 addresses, mac
+            is None for hosts that are not in the table. '''
+
+        addresses = list(addresses)
+
+        with self._lock:
+            if self._stale(time.monotonic()):
+                self._refresh()
+
+            table = self._table
+
+            if table is not None:
+                found = {}
+
+                for address in addresses:
+                    key = canonical(address)
+                    found[address] = (LOOPBACK_MAC
+                                      if key in ("127.0.0.1", "::1")
+                                      else table.get(key))
+                return found
+
+        # The table can not be read at once on this system.
+        return self._lookup_each(addresses)
+
+    def _lookup_each(self, addresses):
+        ''' Return {address: mac} from the single lookups that are younger
+            than ttl, the other addresses are looked up again. '''
+
+        now = time.monotonic()
+        found = {}
+
+        with self._lock:
+            for address in addresses:
+                entry = self._hosts.get(address)
+
+                if entry is not None and now - entry[1] < self.ttl:
+                    found[address] = entry[0]
+
+        missing = [address for address in addresses if address not in found]
+
+        if not missing:
+            return found
+
+        # Looked up without the lock, it runs a command per address.
+        macs = getmac.get_mac_addresses(missing, network_request=False)
+
+        with self._lock:
+            # Forget the hosts that have left.
+            self._hosts = {address: entry
+                           for address, entry in self._hosts.items()
+                           if now - entry[1] < self.ttl}
+
+            for address in missing:
+                found[address] = macs.get(address)
+                self._hosts[address] = (found[address], now)
+
+        return found
+
+
+def gateway_mac():
+    ''' Return the mac address of the default gateway from the cached
+        neighbor table, None if it is not known (i.e. not Linux or the
+        gateway has not been reached yet). '''
+
+    if not netlink.available():
+        return None
+
+    try:
+        gateways = [gateway for _, gateway in netlink.get_default_routes()
+                    if gateway is not None]
+    except OSError as err:
+        logger.debug("[NEIGHBORS]: can not read the default routes! %s", err)
+        return None
+
+    macs = cache().lookup(gateways)
+
+    for gateway in gateways:
+        if macs.get(gateway):
+            return macs[gateway]
+
+    return None
+
+
+_CACHE = None
+
+
+def cache():
+    ''' Return the neighbor cache of the process, created on first use. '''
+
+    global _CACHE
+
+    if _CACHE is None:
+        _CACHE = NeighborCache()
+
+    return _CACHE
@@ -0,0 +1,336 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+netlink.py--ask the Linux kernel for the network interfaces, addresses,
+            routes and neighbors (the ARP/NDP table with the mac addresses
+            of the hosts on the local network) over a netlink socket. One
+            dump request returns all of them, without running a program or
+            asking a DNS server.
+            Monitor waits for the kernel to report changes. Only available
+            on Linux, see available().
+'''
+
+import os
+import select
+import socket
+import struct
+import threading
+
+NETLINK_ROUTE = 0
+
+# Message types.
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+RTM_GETROUTE = 26
+RTM_NEWNEIGH = 28
+RTM_DELNEIGH = 29
+RTM_GETNEIGH = 30
+
+# Message flags.
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+
+# Multicast groups of the change notifications.
+RTMGRP_LINK = 0x1
+RTMGRP_NEIGH = 0x4
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+
+# Attributes.
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+NDA_DST = 1
+NDA_LLADDR = 2
+
+# Neighbor states without a usable hardware address.
+NUD_INCOMPLETE = 0x01
+NUD_FAILED = 0x20
+
+IFF_UP = 0x1
+IFF_LOOPBACK = 0x8
+RT_TABLE_MAIN = 254
+
+NLMSG_HEADER = struct.Struct("=IHHII")  # length, type, flags, seq, pid.
+RTATTR = struct.Struct("=HH")  # length, type.
+IFINFOMSG = struct.Struct("=BxHiII")  # family, type, index, flags, change.
+IFADDRMSG = struct.Struct("=BBBBI")  # family, prefix, flags, scope, index.
+RTMSG = struct.Struct("=BBBBBBBBI")  # family, dst_len, ..., type, flags.
+NDMSG = struct.Struct("=BxxxiHBB")  # family, index, state, flags, type.
+
+RECV_SIZE = 65536
+
+_SEQUENCE = [0]
+_SEQUENCE_LOCK = threading.Lock()
+
+
+class NetlinkError(OSError):
+    ''' Raised when the kernel answers a request with an error. '''
+
+
+def available():
+    ''' Return True if netlink sockets can be used (Linux). '''
+
+    return hasattr(socket, "AF_NETLINK")
+
+
+def align(length):
+    ''' Netlink messages and attributes are aligned to 4 bytes. '''
+
+    return (length + 3) & ~3
+
+
+def next_sequence():
+    ''' Return a new sequence number for a request. '''
+
+    with _SEQUENCE_LOCK:
+        _SEQUENCE[0] += 1
+        return _SEQUENCE[0]
+
+
+def attributes(data, offset):
+    ''' Return the attributes of a message from offset as {type: bytes}. '''
+
+    found = {}
+
+    while offset + RTATTR.size <= len(data):
+        length, kind = RTATTR.unpack_from(data, offset)
+
+        if length < RTATTR.size:
+            break
+
+        found[kind] = data[offset + RTATTR.size:offset + length]
+        offset += align(length)
+
+    return found
+
+
+def messages(data):
+    ''' Yield the (type, flags, seq, body) of the messages in data. '''
+
+    offset = 0
+
+    while offset + NLMSG_HEADER.size <= len(data):
+        length, kind, flags, seq, _ = NLMSG_HEADER.unpack_from(data, offset)
+
+        if length < NLMSG_HEADER.size:
+            break
+
+        yield kind, flags, seq, data[offset + NLMSG_HEADER.size:
+                                     offset + length]
+        offset += align(length)
+
+
+def dump(kind, payload):
+    ''' Send a dump request and return the bodies of the answers. '''
+
+    seq = next_sequence()
+    request = NLMSG_HEADER.pack(NLMSG_HEADER.size + len(payload), kind,
+                                NLM_F_REQUEST | NLM_F_DUMP, seq, 0) + payload
+    answers = []
+
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                       NETLINK_ROUTE) as sock:
+        sock.bind((0, 0))
+        sock.send(request)
+
+        while True:
+            data = sock.recv(RECV_SIZE)
+
+            for answer, _, answer_seq, body in messages(data):
+                if answer_seq != seq:
+                    continue
+
+                if answer == NLMSG_DONE:
+                    return answers
+
+                if answer == NLMSG_ERROR:
+                    (error,) = struct.unpack_from("=i", body)
+
+                    if error:
+                        raise NetlinkError(-error, os.strerror(-error))
+                    continue
+
+                answers.append((answer, body))
+
+
+def format_mac(raw):
+    ''' Return a 6 byte hardware address as "aa:bb:cc:dd:ee:ff" or None
+        if it is not one. '''
+
+    if raw is None or len(raw) != 6:
+        return None
+
+    return ":".join(f"{byte:02x}" for byte in raw)
+
+
+def get_links():
+    ''' Return the interfaces as {index: (name, flags, mac)}, mac is None
+        for interfaces without a hardware address. '''
+
+    links = {}
+
+    for kind, body in dump(RTM_GETLINK,
+                           IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+        if kind != RTM_NEWLINK:
+            continue
+
+        _, _, index, flags, _ = IFINFOMSG.unpack_from(body)
+        found = attributes(body, IFINFOMSG.size)
+        name = found.get(IFLA_IFNAME, b"").rstrip(b"\x00").decode()
+        links[index] = (name, flags, format_mac(found.get(IFLA_ADDRESS)))
+
+    return links
+
+
+def get_addresses():
+    ''' Return the addresses of all interfaces as a list of (index, family,
+        address, prefix, scope, label). '''
+
+    found_addresses = []
+
+    for kind, body in dump(RTM_GETADDR,
+                           IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+        if kind != RTM_NEWADDR:
+            continue
+
+        family, prefix, _, scope, index = IFADDRMSG.unpack_from(body)
+        found = attributes(body, IFADDRMSG.size)
+
+        # IFA_LOCAL is the address of the interface, IFA_ADDRESS the peer
+        #   on point-to-point links.
+        raw = found.get(IFA_LOCAL, found.get(IFA_ADDRESS))
+
+        if raw is None or family not in (socket.AF_INET, socket.AF_INET6):
+            continue
+
+        label = found.get(IFA_LABEL, b"").rstrip(b"\x00").decode()
+        found_addresses.append((index, family, socket.inet_ntop(family, raw),
+                                prefix, scope, label))
+
+    return found_addresses
+
+
+def get_default_routes(family=socket.AF_INET):
+    ''' Return the default routes as a list of (interface index, gateway),
+        gateway is None for routes without one. '''
+
+    routes = []
+
+    for kind, body in dump(RTM_GETROUTE,
+                           RTMSG.pack(family, 0, 0, 0, 0, 0, 0, 0, 0)):
+        if kind != RTM_NEWROUTE:
+            continue
+
+        _, dst_len, _, _, table, _, _, _, _ = RTMSG.unpack_from(body)
+
+        if dst_len != 0 or table != RT_TABLE_MAIN:
+            continue
+
+        found = attributes(body, RTMSG.size)
+
+        if RTA_OIF not in found:
+            continue
+
+        (index,) = struct.unpack("=i", found[RTA_OIF])
+        gateway = found.get(RTA_GATEWAY)
+
+        if gateway is not None:
+            gateway = socket.inet_ntop(family, gateway)
+
+        routes.append((index, gateway))
+
+    return routes
+
+
+def parse_neighbor(body):
+    ''' Return the (interface index, address, mac, state) of a neighbor
+        message or None if it is not an IPv4 or IPv6 neighbor. mac is None
+        while the neighbor has no usable hardware address. '''
+
+    family, index, state, _, _ = NDMSG.unpack_from(body)
+    found = attributes(body, NDMSG.size)
+
+    if family not in (socket.AF_INET, socket.AF_INET6) or NDA_DST not in found:
+        return None
+
+    mac = None
+
+    if not state & (NUD_INCOMPLETE | NUD_FAILED):
+        mac = format_mac(found.get(NDA_LLADDR))
+
+    return index, socket.inet_ntop(family, found[NDA_DST]), mac, state
+
+
+def get_neighbors(family=socket.AF_UNSPEC):
+    ''' Return the neighbor table (ARP for IPv4, NDP for IPv6) as a list
+        of (interface index, address, mac, state). Entries without a
+        hardware address (incomplete or failed) are left out. '''
+
+    neighbors = []
+
+    for kind, body in dump(RTM_GETNEIGH, NDMSG.pack(family, 0, 0, 0, 0)):
+        if kind != RTM_NEWNEIGH:
+            continue
+
+        neighbor = parse_neighbor(body)
+
+        if neighbor is not None and neighbor[2] is not None:
+            neighbors.append(neighbor)
+
+    return neighbors
+
+
+class Monitor():
+    ''' A netlink socket that receives the kernel notifications of the
+        given groups, i.e. addresses that were added or removed. '''
+
+    def __init__(self, groups=(RTMGRP_LINK | RTMGRP_IPV4_IFADDR |
+                               RTMGRP_IPV6_IFADDR | RTMGRP_IPV4_ROUTE)):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                  NETLINK_ROUTE)
+        self.sock.bind((0, groups))
+
+    def wait(self, timeout=None):
+        ''' Wait for notifications, returns the list of their message types
+            (empty after the timeout). '''
+
+        return [kind for kind, _ in self.receive(timeout)]
+
+    def receive(self, timeout=None):
+        ''' Wait for notifications, returns the list of their (type, body)
+            (empty after the timeout). '''
+
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+
+        if not readable:
+            return []
+
+        data = self.sock.recv(RECV_SIZE)
+
+        return [(kind, body) for kind, _, _, body in messages(data)]
+
+    def close(self):
+        ''' Close the netlink socket. '''
+
+        self.sock.close()
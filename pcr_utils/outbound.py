@@ -0,0 +1,353 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+outbound.py--bounded queues of the messages waiting to be sent to a client.
+             broadcast() only puts a message in the queue of every client and
+             a writer per client (a thread or an asyncio task) sends them, so
+             one slow client no longer holds up the whole room.
+             A message is wrapped in one Frame that is shared by the queues
+             of all its recipients, the writers send the queued frames with
+             scatter-gather sendmsg() calls without copying them.
+'''
+
+import os
+import threading
+import time
+from collections import deque
+from pcr_utils import framing
+from pcr_utils import metrics
+from pcr_utils import settings
+
+# Largest number of buffers passed to one sendmsg() call.
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+
+# Kinds of frames, the backpressure policy never drops control frames
+#   (i.e. the server stopped message) and may drop presence frames (user
+#   count, joined messages) before chat messages.
+CHAT = "chat"
+PRESENCE = "presence"
+CONTROL = "control"
+
+# Backpressure policies for a client that is over its outbound budget.
+DROP_OLDEST = "drop-oldest"
+DROP_PRESENCE = "drop-presence"
+DISCONNECT = "disconnect"
+POLICIES = (DROP_OLDEST, DROP_PRESENCE, DISCONNECT)
+
+
+class Frame():
+    ''' An encoded message that is shared by the outbound queues of all its
+        recipients. It holds the payload and the length prefix for framed
+        clients, so nothing is copied per recipient. The kind tells the
+        backpressure policy what may be dropped, created is the
+        time.monotonic() of the broadcast for the fan-out latency. '''
+
+    __slots__ = ("header", "payload", "kind", "created")
+
+    def __init__(self, payload, kind=CHAT):
+        self.header = framing.HEADER.pack(len(payload))
+        self.payload = memoryview(payload).toreadonly()
+        self.kind = kind
+        self.created = time.monotonic()
+
+    def __len__(self):
+        return len(self.payload)
+
+    def buffers(self, framed):
+        ''' Return the buffers to send to a framed or a plain client. '''
+
+        if framed:
+            return (self.header, self.payload)
+
+        return (self.payload,)
+
+
+class OutboundQueue():
+    ''' A queue of the frames for one client with a budget of messages and
+        bytes. The ready event is set while there is something for the
+        writer to do, a threading.Event for writer threads or an
+        asyncio.Event for writer tasks running on the event loop.
+
+        When a client does not keep up and its queue goes over the budget,
+        the policy decides what happens:
+            drop-oldest    drop the oldest chat and presence frames.
+            drop-presence  drop presence frames first, then the oldest
+                           chat frames.
+            disconnect     drop the oldest frames like drop-oldest and call
+                           on_overflow() once the queue has been over the
+                           budget for disconnect_after seconds.
+        Control frames are never dropped. on_over_budget() is called once
+        each time the queue goes over the budget, the dropped frames are
+        only counted. '''
+
+    def __init__(self, event=None, on_overflow=None, max_messages=None,
+                 max_bytes=None, policy=None, disconnect_after=None,
+                 on_over_budget=None):
+        options = settings.config()["outbound"]
+
+        if max_messages is None:
+            max_messages = options.getint("max_messages")
+        if max_bytes is None:
+            max_bytes = options.getint("max_bytes")
+        if policy is None:
+            policy = options.get("policy")
+        if disconnect_after is None:
+            disconnect_after = options.getfloat("disconnect_after")
+
+        if policy not in POLICIES:
+            raise ValueError(f"unknown outbound policy {policy}")
+
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.disconnect_after = disconnect_after
+        self.on_overflow = on_overflow
+        self.on_over_budget = on_over_budget
+        self.ready = event if event is not None else threading.Event()
+        self.closed = False
+        self.nbytes = 0  # Number of bytes waiting in the queue.
+        self.dropped = 0  # Number of frames dropped by the policy.
+        self.over_since = None  # Time the queue went over the budget.
+        self._messages = deque()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._messages)
+
+    @property
+    def depth(self):
+        ''' Number of frames waiting to be sent. '''
+
+        return len(self._messages)
+
+    def put(self, message):
+        ''' Add a frame to the queue, returns False if it was dropped
+            because the queue is over its budget or closed. '''
+
+        return self._put((message,))[1]
+
+    def put_many(self, messages):
+        ''' Add a batch of frames to the queue, returns the number of
+            frames that were dropped because the queue is over its budget
+            or closed. '''
+
+        return self._put(messages)[0]
+
+    def _put(self, messages):
+        ''' Add the frames, returns the number of dropped frames and True
+            if the last of the new frames is still queued. '''
+
+        overflow = False
+        went_over = False
+
+        with self._lock:
+            if self.closed:
+                return len(messages), False
+
+            self._messages.extend(messages)
+            self.nbytes += sum(len(message) for message in messages)
+            dropped = 0
+
+            if self._over_budget():
+                now = time.monotonic()
+
+                if self.over_since is None:
+                    self.over_since = now
+                    went_over = True
+
+                elif (self.policy == DISCONNECT and
+                      now - self.over_since >= self.disconnect_after):
+                    overflow = True
+
+                if self.policy == DROP_PRESENCE:
+                    dropped += self._drop_oldest((PRESENCE,))
+
+                dropped += self._drop_oldest((CHAT, PRESENCE))
+                self.dropped += dropped
+
+            # Kept frames stay in order, the last new frame is still at the
+            #   end unless it was dropped.
+            queued = (bool(messages) and bool(self._messages) and
+                      self._messages[-1] is messages[-1])
+            self.ready.set()
+
+        if went_over and self.on_over_budget is not None:
+            self.on_over_budget()
+
+        if overflow and self.on_overflow is not None:
+            self.close()
+            self.on_overflow()
+
+        return dropped, queued
+
+    def _over_budget(self, count=None):
+        if count is None:
+            count = len(self._messages)
+
+        return count > self.max_messages or self.nbytes > self.max_bytes
+
+    def _drop_oldest(self, kinds):
+        ''' Drop the oldest frames of the given kinds until the queue is
+            within its budget, returns the number of dropped frames. '''
+
+        kept = deque()
+        dropped = 0
+
+        # The kept frames still count against the budget.
+        while (self._messages and
+               self._over_budget(len(kept) + len(self._messages))):
+            message = self._messages.popleft()
+
+            if message.kind in kinds:
+                self.nbytes -= len(message)
+                dropped += 1
+            else:
+                kept.append(message)
+
+        if kept:
+            kept.extend(self._messages)
+            self._messages = kept
+
+        return dropped
+
+    def take(self):
+        ''' Remove and return all the waiting frames. '''
+
+        with self._lock:
+            messages = list(self._messages)
+            self._messages.clear()
+            self.nbytes = 0
+
+            # The writer keeps up again.
+            self.over_since = None
+
+            # Keep the event set once closed, so the writer wakes up
+            #   and finishes.
+            if not self.closed:
+                self.ready.clear()
+
+        return messages
+
+    def close(self):
+        ''' Close the queue, the writer sends the frames that are still
+            waiting and stops. '''
+
+        with self._lock:
+            self.closed = True
+            self.ready.set()
+
+
+def send_buffers(client, buffers):
+    ''' Send a list of buffers with scatter-gather sendmsg() calls. A
+        partial write continues where the last call stopped. '''
+
+    # Platforms without sendmsg() (Windows) send one joined buffer.
+    if not hasattr(client, "sendmsg"):
+        client.sendall(b"".join(buffers))
+        return
+
+    index = 0
+    count = len(buffers)
+
+    while index < count:
+        sent = client.sendmsg(buffers[index:index + IOV_MAX])
+
+        # Skip the buffers that were sent completely.
+        while index < count and sent >= len(buffers[index]):
+            sent -= len(buffers[index])
+            index += 1
+
+        # Send the rest of a partly sent buffer with the next call.
+        if sent:
+            buffers[index] = memoryview(buffers[index])[sent:]
+
+
+def sent(session, frames, nbytes):
+    ''' Count the frames that were sent to a session and record how long
+        the oldest of them took from the broadcast to the socket. '''
+
+    session.sent(len(frames), nbytes)
+    metrics.fanout_latency.add(
+                   time.monotonic() - min(frame.created for frame in frames))
+
+
+def write_queued(session, on_error=None):
+    ''' Thread target that sends the queued frames to the socket of a
+        session until its queue is closed. on_error(session) is called if
+        the connection fails. '''
+
+    queue = session.queue
+
+    while True:
+        queue.ready.wait()
+        frames = queue.take()
+
+        if not frames:
+            if queue.closed:
+                break
+            continue
+
+        buffers = []
+
+        for frame in frames:
+            buffers.extend(frame.buffers(session.framed))
+
+        # Counted before sending, send_buffers() replaces partly sent
+        #   buffers with their rest.
+        nbytes = sum(len(buffer) for buffer in buffers)
+
+        try:
+            send_buffers(session.sock, buffers)
+
+        except OSError:
+            if on_error is not None:
+                on_error(session)
+            break
+
+        sent(session, frames, nbytes)
+
+
+async def write_queued_async(session):
+    ''' Coroutine that writes the queued frames to the asyncio stream of a
+        session until its queue is closed. '''
+
+    queue = session.queue
+
+    while True:
+        await queue.ready.wait()
+        frames = queue.take()
+
+        if not frames:
+            if queue.closed:
+                break
+            continue
+
+        buffers = []
+
+        for frame in frames:
+            buffers.extend(frame.buffers(session.framed))
+
+        nbytes = sum(len(buffer) for buffer in buffers)
+
+        try:
+            # The transport sends the buffers with sendmsg() where the
+            #   Python version supports it.
+            session.stream.writelines(buffers)
+
+            # Wait until the transport has flushed its buffer.
+            await session.stream.drain()
+
+        except OSError:
+            session.stream.close()
+            break
+
+        sent(session, frames, nbytes)
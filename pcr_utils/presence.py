@@ -0,0 +1,144 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+presence.py--the "joined the chat" and "people are online" messages. Joins
+             and leaves within a short window are merged into one joined
+             message and one user count, and the count is only sent when it
+             has changed, so presence stays a small share of the traffic.
+'''
+
+import functools
+import threading
+from pcr_utils import settings
+from pcr_utils.server_logging import server_log
+
+logger = server_log(__name__)
+
+# Encoding format for data being sent over the socket.
+FORMAT = "utf-8"
+
+
+@functools.lru_cache(maxsize=256)
+def count_message(devices):
+    ''' Return the user count message that is sent to the clients or None
+        if nobody is online. The messages are cached, so they are only
+        encoded once. '''
+
+    if devices > 1:
+        return f"{devices} people are online...\n".encode(FORMAT)
+
+    if devices == 1:
+        return f"{devices} person is online...\n".encode(FORMAT)
+
+    return None
+
+
+def joined_message(aliases, max_names):
+    ''' Return the message for the users that joined, listing at most
+        max_names aliases. '''
+
+    if len(aliases) == 1:
+        names = aliases[0]
+    elif len(aliases) <= max_names:
+        names = f"{', '.join(aliases[:-1])} and {aliases[-1]}"
+    else:
+        others = len(aliases) - max_names
+        noun = "other" if others == 1 else "others"
+        names = f"{', '.join(aliases[:max_names])} and {others} {noun}"
+
+    return f"\t{names} joined the chat...\n".encode(FORMAT)
+
+
+def log_count(devices):
+    ''' Log the number of connected clients. '''
+
+    if devices == 1:
+        logger.info("[CONNECTIONS]: %s device is connected...", devices)
+    else:
+        logger.info("[CONNECTIONS]: %s devices are connected...", devices)
+
+
+def start_timer(delay, callback):
+    ''' Call callback after delay seconds in a timer thread. '''
+
+    timer = threading.Timer(delay, callback)
+    timer.daemon = True
+    timer.start()
+
+
+class Presence():
+    ''' Collect joins and user count changes and send them together once
+        the window has passed. send(message) broadcasts a presence message
+        and schedule(delay, callback) runs the flush later, start_timer()
+        for the threaded engine or loop.call_later() for asyncio. '''
+
+    def __init__(self, send, schedule=start_timer, window=None,
+                 max_names=None):
+        options = settings.config()["presence"]
+
+        if window is None:
+            window = options.getfloat("window")
+        if max_names is None:
+            max_names = options.getint("max_names")
+
+        self.send = send
+        self.schedule = schedule
+        self.window = window
+        self.max_names = max_names
+        self._joined = []
+        self._count = 0
+        self._sent_count = None
+        self._scheduled = False
+        self._lock = threading.Lock()
+
+    def joined(self, alias, count):
+        ''' A user has joined, count is the new number of users. '''
+
+        with self._lock:
+            self._joined.append(alias)
+            self._changed(count)
+
+    def changed(self, count):
+        ''' The number of users has changed, i.e. a user has left. '''
+
+        with self._lock:
+            self._changed(count)
+
+    def _changed(self, count):
+        self._count = count
+
+        # The first change in a window schedules the flush.
+        if not self._scheduled:
+            self._scheduled = True
+            self.schedule(self.window, self.flush)
+
+    def flush(self):
+        ''' Send the collected joins and the user count. '''
+
+        with self._lock:
+            aliases = self._joined
+            count = self._count
+            self._joined = []
+            self._scheduled = False
+
+            # New users need the count even if it has not changed.
+            if count == self._sent_count and not aliases:
+                return
+
+            self._sent_count = count
+
+        if aliases:
+            self.send(joined_message(aliases, self.max_names))
+
+        message = count_message(count)
+
+        if message:
+            self.send(message)
+
+        log_count(count)
@@ -0,0 +1,294 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+public_ip.py--look up the public IPv4 address by asking several providers at
+              the same time and taking the first valid answer, so the lookup
+              takes as long as the fastest provider instead of waiting for
+              each one to time out in turn.
+
+              The providers are set in the [discovery] section of the
+              settings, one per line:
+                  json URL           JSON answer with an "ip" key
+                  text URL           the address as plain text
+                  dns SERVER NAME    A record of NAME asked from SERVER, i.e.
+                                     resolver1.opendns.com myip.opendns.com
+
+              A provider that fails breaker_failures times in a row is left
+              out for breaker_cooldown seconds, then it gets another chance.
+'''
+
+import ipaddress
+import queue
+import random
+import socket
+import struct
+import threading
+import time
+from pcr_utils import settings
+from pcr_utils.server_logging import server_log
+
+logger = server_log(__name__)
+
+DNS_HEADER = struct.Struct("!HHHHHH")  # id, flags and the record counts.
+DNS_RECORD = struct.Struct("!HHIH")  # type, class, ttl and data length.
+DNS_PORT = 53
+
+
+def fetch_json(url, timeout):
+    ''' Return the "ip" of the JSON answer of an HTTP endpoint. '''
+
+    # Imported here, importing requests takes longer than starting the
+    #   server.
+    import requests
+
+    response = requests.get(url, verify=True, timeout=timeout)
+    response.raise_for_status()
+
+    return response.json()["ip"]
+
+
+def fetch_text(url, timeout):
+    ''' Return the plain text answer of an HTTP endpoint. '''
+
+    import requests
+
+    response = requests.get(url, verify=True, timeout=timeout)
+    response.raise_for_status()
+
+    # An address is ASCII, decoding it directly skips the charset
+    #   detection of response.text when the server does not send one.
+    return response.content.decode("ascii")
+
+
+def dns_query(name):
+    ''' Return a DNS query for the A record of name and its id. '''
+
+    query_id = random.getrandbits(16)
+
+    # Recursion desired, one question.
+    header = DNS_HEADER.pack(query_id, 0x0100, 1, 0, 0, 0)
+    labels = b"".join(bytes([len(label)]) + label
+                      for label in name.encode("ascii").split(b"."))
+
+    # Type A, class IN.
+    return header + labels + b"\x00" + struct.pack("!HH", 1, 1), query_id
+
+
+def skip_name(data, offset):
+    ''' Return the offset after a (possibly compressed) name. '''
+
+    while True:
+        length = data[offset]
+
+        # A pointer to a name earlier in the message ends the name.
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+
+        if length == 0:
+            return offset + 1
+
+        offset += length + 1
+
+
+def dns_answer(data, query_id):
+    ''' Return the first A record of a DNS answer. '''
+
+    answer_id, flags, questions, answers, _, _ = DNS_HEADER.unpack_from(data)
+
+    if answer_id != query_id or flags & 0x000F:
+        raise ValueError("no valid DNS answer")
+
+    offset = DNS_HEADER.size
+
+    for _ in range(questions):
+        offset = skip_name(data, offset) + 4
+
+    for _ in range(answers):
+        offset = skip_name(data, offset)
+        kind, _, _, length = DNS_RECORD.unpack_from(data, offset)
+        offset += DNS_RECORD.size
+
+        if kind == 1 and length == 4:
+            return socket.inet_ntoa(data[offset:offset + 4])
+
+        offset += length
+
+    raise ValueError("no A record in the DNS answer")
+
+
+def fetch_dns(server, name, timeout):
+    ''' Return the A record of name asked from the DNS server, server may
+        be "host" or "host:port". '''
+
+    host, _, port = server.partition(":")
+    query, query_id = dns_query(name)
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect((host, int(port or DNS_PORT)))
+        sock.send(query)
+
+        return dns_answer(sock.recv(512), query_id)
+
+
+# Functions that ask a provider, by kind.
+FETCHERS = {
+    "json": fetch_json,
+    "text": fetch_text,
+    "dns": fetch_dns,
+}
+
+
+class Provider():
+    ''' One provider of the public IP address with its circuit breaker. '''
+
+    def __init__(self, kind, args, failures=3, cooldown=300):
+        if kind not in FETCHERS:
+            raise ValueError(f"unknown public IP provider {kind}")
+
+        self.kind = kind
+        self.args = args
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.failures = 0  # Failures in a row.
+        self.open_until = 0.0  # Left out until then (time.monotonic()).
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Provider({self.kind} {' '.join(self.args)})"
+
+    def available(self, now=None):
+        ''' Return False while the breaker is open. '''
+
+        if now is None:
+            now = time.monotonic()
+
+        return now >= self.open_until
+
+    def fetch(self, timeout):
+        ''' Ask the provider, returns the address or raises an error. '''
+
+        answer = FETCHERS[self.kind](*self.args, timeout)
+
+        return str(ipaddress.IPv4Address(str(answer).strip()))
+
+    def succeeded(self):
+        ''' Close the breaker. '''
+
+        with self._lock:
+            self.failures = 0
+            self.open_until = 0.0
+
+    def failed(self):
+        ''' Count a failure, opens the breaker once there are too many. '''
+
+        with self._lock:
+            self.failures += 1
+
+            if self.failures >= self.max_failures:
+                self.open_until = time.monotonic() + self.cooldown
+                logger.warning("[PUBLIC IP]: %s left out for %s seconds",
+                               self, self.cooldown)
+
+
+def parse_providers(text, failures=3, cooldown=300):
+    ''' Return the providers of the "kind arguments..." lines of text. '''
+
+    providers = []
+
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+
+        kind, *args = line.split()
+        providers.append(Provider(kind, args, failures, cooldown))
+
+    return providers
+
+
+class Resolver():
+    ''' Ask all available providers at the same time and return the first
+        valid answer. Can be passed as resolver to
+        ipv4_addresses.get_public(). '''
+
+    def __init__(self, providers=None, timeout=None):
+        options = settings.config()["discovery"]
+
+        if providers is None:
+            providers = parse_providers(options.get("providers"),
+                                        options.getint("breaker_failures"),
+                                        options.getfloat("breaker_cooldown"))
+        if timeout is None:
+            timeout = options.getfloat("timeout")
+
+        self.providers = providers
+        self.timeout = timeout
+
+    def __call__(self):
+        ''' Return the public IPv4 address or None if no provider has
+            answered within the timeout. '''
+
+        now = time.monotonic()
+        providers = [provider for provider in self.providers
+                     if provider.available(now)]
+
+        if not providers:
+            logger.warning("[PUBLIC IP]: %s", "every provider is left out")
+            return None
+
+        answers = queue.Queue()
+
+        for provider in providers:
+            threading.Thread(target=self._ask, args=(provider, answers),
+                             daemon=True).start()
+
+        deadline = now + self.timeout
+
+        # The slower providers are not waited for, their late answers
+        #   only update their breakers.
+        for _ in providers:
+            try:
+                ip_addr = answers.get(
+                    timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+
+            if ip_addr is not None:
+                return ip_addr
+
+        return None
+
+    def _ask(self, provider, answers):
+        try:
+            ip_addr = provider.fetch(self.timeout)
+
+        except (OSError, ValueError, KeyError, TypeError, IndexError,
+                struct.error) as err:
+            logger.debug("[PUBLIC IP]: %s failed! %s", provider, err)
+            provider.failed()
+            answers.put(None)
+            return
+
+        provider.succeeded()
+        answers.put(ip_addr)
+
+
+_RESOLVER = None
+
+
+def default_resolver():
+    ''' Return the resolver of the providers in the settings, it is kept
+        so its breakers last across restarts of the server. '''
+
+    global _RESOLVER
+
+    if _RESOLVER is None:
+        _RESOLVER = Resolver()
+
+    return _RESOLVER
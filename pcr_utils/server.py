@@ -16,10 +16,18 @@ chat_server.py--a simple module implementation of a basic chat room
 '''
 
 import sys
+import functools
 import socket
 import threading
-from time import sleep
+import time
+from pcr_utils import events
+from pcr_utils import framing
 from pcr_utils import ipv4_addresses
+from pcr_utils import metrics
+from pcr_utils import outbound
+from pcr_utils import presence
+from pcr_utils import sessions
+from pcr_utils import settings
 from pcr_utils.server_logging import server_log
 
 logger = server_log(__name__)
@@ -27,20 +35,68 @@ logger = server_log(__name__)
 # Log the starting of the program.
 logger.debug("[START] program started by the user...")
 
-# Assigning Public and Private IP Addresses.
-# Get the public IPv4 address of the machine.
-PUBLIC_IP = ipv4_addresses.get_public()
-
-# Get the private IPv4 address of the host machine.
-PRIVATE_IP = ipv4_addresses.get_private()
+# Public and private IPv4 addresses of the machine, start() looks them up
+#   in the background and the server listens without waiting for them.
+PUBLIC_IP = None
+PRIVATE_IP = None
 
 # Encoding format for data being sent/received over the socket.
 FORMAT = "utf-8"
 
-client_list = []  # Initialize an empty list to store client objects.
-alias_list = []  # Initialize an empty list to store aliases of clients.
+# The sessions of the connected clients, shared by both engines.
+registry = sessions.Registry()
+
+# The connections that have not sent their alias yet, closed by stop().
+handshakes = sessions.Handshakes(registry)
 SERVER_SOCKET = ""
 
+# Collects joins and user count changes, set up by start().
+presence_updates = None
+
+# Broadcast bus to the other worker processes when running with more than
+#   one worker (see worker_pool.py), None for a single process.
+bus = None
+WORKERS = 1  # Number of worker processes of the running server.
+
+# Available server engines, "threads" starts one thread per client and
+#   "asyncio" runs every client as a coroutine on a single event loop.
+ENGINES = ("threads", "asyncio")
+ENGINE = ""  # Engine of the running server.
+
+# Thread that publishes throughput events while events are enabled.
+SAMPLER = None
+
+# Messages that let the users know that the server stopped.
+STOP_MESSAGES = (
+    "\n\t\t\tthe server has been stopped...\n".encode(FORMAT),
+    "\t\tplease close the app and relaunch once the server is online..\n"
+    .encode(FORMAT),
+)
+
+
+def set_public_ip(ip_add):
+    ''' Store the public IPv4 address once it is known. '''
+
+    global PUBLIC_IP
+    PUBLIC_IP = ip_add
+
+
+def set_private_ip(ip_add):
+    ''' Store the private IPv4 address once it is known. '''
+
+    global PRIVATE_IP
+    PRIVATE_IP = ip_add
+
+
+def private_ip():
+    ''' Return the private IPv4 address, looked up on first use if the
+        background lookup has not finished yet. '''
+
+    if PRIVATE_IP is None:
+        set_private_ip(ipv4_addresses.get_private())
+
+    return PRIVATE_IP
+
 
 def read_ip():
     ''' Get the ip that the server will listen on. '''
@@ -57,9 +113,9 @@ def read_ip():
         # If the file does not exist or an error during reading the file
         #   occurs, create a new file with the a default port number 5050.
         with open(".pcr_ip_port.txt", "w+", encoding="utf-8") as file:
-            info_txt = f"{PRIVATE_IP}:5050"
+            ip_add = private_ip()
+            info_txt = f"{ip_add}:5050"
             file.write(info_txt)
-            ip_add = PRIVATE_IP
             return ip_add
 
 
@@ -78,68 +134,468 @@ def read_port():
         # If the file does not exist or an error during reading the file
         #   occurs, create a new file with the a default port number 5050.
         with open(".pcr_ip_port.txt", "w+", encoding="utf-8") as file:
-            info_txt = f"{PRIVATE_IP}:5050"
+            info_txt = f"{private_ip()}:5050"
             file.write(info_txt)
             port = 5050
             return port
 
 
-def broadcast(message):
+def broadcast(message, kind=outbound.CHAT):
     ''' Function to broadcast a message to all connected clients. '''
 
-    for client in client_list:
-        try:
-            client.send(message)
+    broadcast_batch((message,), kind)
 
-            # Delay sending messages.
-            sleep(0.2)
 
-        except BrokenPipeError:
-            # If a user has closed the app, close the client's connection.
-            client.close()
+def broadcast_batch(messages, kind=outbound.CHAT):
+    ''' Broadcast a batch of messages to all connected clients. Each
+        message is wrapped in one Frame that is put in the outbound queue
+        of every client and sent by the client's writer. '''
 
-            # Store the disconnected user in the index variable.
-            index = client_list.index(client)
+    frames = [outbound.Frame(message, kind) for message in messages]
 
-            # Log that the user has left the chat.
-            msg = "has left the chat..."
-            alias = f"{alias_list[index].decode(FORMAT)}"
+    # Dropped frames are counted by the queues, over_budget() logs when
+    #   a client starts falling behind. The writers record the fan-out
+    #   latency once the frames are sent.
+    for session in registry.snapshot():
+        session.queue.put_many(frames)
 
-            logger.info(" %s %s", alias, msg)
 
-            # Delete the disconnected user from both lists.
-            del client_list[index]
-            del alias_list[index]
+def publish(messages):
+    ''' Broadcast a batch of chat messages received from a client, also
+        to the clients of the other worker processes. '''
 
-            # Update the user count.
-            user_count(len(client_list), new=True)
+    broadcast_batch(messages)
 
-        except OSError:
-            pass
+    if bus is not None:
+        bus.publish(messages)
+
+
+def online():
+    ''' Return the number of users online, in all worker processes. '''
+
+    if bus is not None:
+        return len(registry) + bus.remote_users
+
+    return len(registry)
+
+
+def announce_join(alias):
+    ''' Let all users know that a new user has joined and update the user
+        count, joins are sent together once the presence window has
+        passed. '''
+
+    count = online()
+    presence_updates.joined(alias, count)
+
+    if bus is not None:
+        bus.joined(alias, len(registry))
+
+    events.publish(events.JOIN, alias=alias, count=count)
+    events.publish(events.COUNT, count=count)
+
+
+def announce_leave(alias):
+    ''' Update the user count after a user has left. '''
+
+    count = online()
+    presence_updates.changed(count)
+
+    if bus is not None:
+        bus.count(len(registry))
+
+    events.publish(events.LEAVE, alias=alias, count=count)
+    events.publish(events.COUNT, count=count)
+
+
+def sample_throughput():
+    ''' Thread target that publishes the messages and bytes per second
+        of all clients as events while events are enabled. '''
+
+    interval = settings.config().getfloat("server", "sample_interval")
+    keys = ("messages_in", "messages_out", "bytes_in", "bytes_out")
+    last, last_at = stats(), time.monotonic()
+
+    while events.enabled():
+        time.sleep(interval)
+
+        current, now = stats(), time.monotonic()
+
+        # The totals of a worker that has stopped are gone.
+        rates = {key: max(0, current[key] - last[key]) / (now - last_at)
+                 for key in keys}
+        last, last_at = current, now
+
+        events.publish(events.THROUGHPUT, clients=current["clients"],
+                       **rates)
+
+
+def remove_client(session):
+    ''' Close the connection of a client that has left and remove it
+        from the registry. '''
+
+    # The reader and the writer thread may both notice the
+    #   disconnect, only the first one removes the client.
+    if not registry.remove(session):
+        return
+
+    # Stop the writer thread of the client.
+    session.queue.close()
+
+    # If a user has closed the app, close the client's connection. The
+    #   shutdown wakes up a writer thread that is blocked in a send.
+    try:
+        session.sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+    session.sock.close()
+
+    # Log that the user has left the chat.
+    msg = "has left the chat..."
+    logger.info(" %s %s", session.alias, msg)
+
+    # Update the user count.
+    announce_leave(session.alias)
+
+
+def over_budget(session):
+    ''' Log that a client went over its outbound budget, once until it
+        has caught up again. '''
+
+    logger.info("[QUEUE]: %s is over its outbound budget, %s %s",
+                session.alias, session.queue.policy, "applies...")
+
+
+def disconnect_slow(session):
+    ''' Disconnect a client that has been over its outbound budget for
+        too long. '''
+
+    logger.warning("[SLOW]: %s %s", session.alias,
+                   "is over its outbound limit, disconnecting...")
+
+    if session.stream is None:
+        remove_client(session)
+    else:
+        # The handler coroutine notices and removes the client.
+        session.stream.transport.abort()
+
+
+def kick(session):
+    ''' Disconnect a client, i.e. one that hogs the bandwidth, may be
+        called from any thread. Returns False if it is not connected. '''
+
+    if session not in registry:
+        return False
+
+    logger.info("[KICK]: %s ip: %s %s", session.alias, session.address[0],
+                "is disconnected by the operator...")
+
+    if session.stream is None:
+        remove_client(session)
+        return True
+
+    # Imported here, the asyncio engine imports this module.
+    from pcr_utils import async_server
+
+    # The transport belongs to the event loop, the handler coroutine
+    #   notices and removes the client.
+    loop = async_server.LOOP
+
+    if loop is None:
+        return False
+
+    loop.call_soon_threadsafe(session.stream.transport.abort)
+
+    return True
+
+
+def kick_client(key):
+    ''' Disconnect the client of a key of client_rows(), may be called
+        from any thread. Returns False if it is not connected. '''
+
+    if isinstance(key, tuple):
+        # Imported here, the worker pool imports this module.
+        from pcr_utils import worker_pool
+        return worker_pool.kick(*key)
+
+    session = registry.get(key)
+
+    return session is not None and kick(session)
+
+
+def client_info(session):
+    ''' Return (alias, ip, mac, connected_at, messages_in, messages_out,
+        bytes_in, bytes_out, queued, last_active) of a session, mac is ""
+        until it has been looked up. '''
+
+    queued = session.queue.depth if session.queue is not None else 0
+
+    return (session.alias, session.address[0], session.mac or "",
+            session.connected_at, session.messages_in, session.messages_out,
+            session.bytes_in, session.bytes_out, queued, session.last_active)
+
+
+def client_rows():
+    ''' Return {key: client_info()} of the connected clients. The key is
+        the file descriptor of a client of this process and (worker, file
+        descriptor) of a client of a worker process, whose rows are the
+        ones of its last report. '''
+
+    if WORKERS > 1 and bus is None:
+        # Imported here, the worker pool imports this module.
+        from pcr_utils import worker_pool
+        return worker_pool.client_rows()
+
+    return {session.fd: client_info(session)
+            for session in registry.snapshot()}
+
+
+def queue_depths():
+    ''' Return a list of (alias, depth, bytes, dropped) of the outbound
+        queue of every client, the client that lags the most first. '''
+
+    depths = [(session.alias, session.queue.depth, session.queue.nbytes,
+               session.queue.dropped)
+              for session in registry.snapshot()]
+
+    return sorted(depths, key=lambda item: item[1], reverse=True)
+
+
+def client_macs():
+    ''' Look up the mac addresses of the connected clients that were not
+        looked up yet in one pass over the cached neighbor table and store
+        them in their sessions. Returns a list of (alias, ip, mac), mac is
+        "" for clients that are not on the local network, they are not
+        looked up again. '''
+
+    # Imported here, only needed when the macs are asked for.
+    from pcr_utils import neighbors
+
+    clients = registry.snapshot()
+    missing = [session for session in clients if session.mac is None]
+
+    if missing:
+        macs = neighbors.cache().lookup(
+            {session.address[0] for session in missing})
 
+        for session in missing:
+            session.mac = macs.get(session.address[0]) or ""
 
-def handle_clients(client):
-    ''' Threaded function to handle incoming messages from clients. '''
+            if session.mac:
+                logger.info("[MAC]: %s ip: %s mac: %s", session.alias,
+                            session.address[0], session.mac)
+
+    return [(session.alias, session.address[0], session.mac)
+            for session in clients]
+
+
+def stats():
+    ''' Return the current measurements of the server as a dict: users
+        online, total messages and bytes in and out, fan-out and join
+        latency percentiles in seconds, the five clients with the deepest
+        outbound queues (see queue_depths()), the number of threads and
+        asyncio tasks and of worker processes. With more than one worker
+        they are combined from the last reports of the workers (see
+        worker_pool.stats()). '''
+
+    if WORKERS > 1 and bus is None:
+        # Imported here, the worker pool imports this module.
+        from pcr_utils import worker_pool
+        return worker_pool.stats()
+
+    messages_in, messages_out, bytes_in, bytes_out = registry.totals()
+    tasks = 0
+
+    if ENGINE == "asyncio" and WORKERS == 1:
+        # Imported here, the asyncio engine imports this module.
+        from pcr_utils import async_server
+        tasks = async_server.task_count()
+
+    return {"clients": online(),
+            "messages_in": messages_in, "messages_out": messages_out,
+            "bytes_in": bytes_in, "bytes_out": bytes_out,
+            "fanout": metrics.fanout_latency.percentiles(),
+            "join": metrics.join_latency.percentiles(),
+            "slowest": queue_depths()[:5],
+            "threads": threading.active_count(),
+            "tasks": tasks,
+            "workers": WORKERS}
+
+
+def handle_clients(session, reader=None):
+    ''' Threaded function to handle incoming messages from clients. A
+        framed client has a FrameReader, all the frames completed by one
+        recv() are broadcast as a batch. '''
+
+    client = session.sock
 
     while True:
         try:
             # Receive data from the client and print its alias.
-            message = client.recv(2048)
-
-            # Broadcast the received message to all the clients.
-            broadcast(message)
-            sleep(0.2)
-
-            # Update the user count.
-            user_count(len(client_list))
+            if reader is None:
+                data = client.recv(2048)
+            else:
+                data = client.recv(framing.RECV_SIZE)
 
         except OSError:
+            # i.e. the connection was reset, the client is gone as well.
+            remove_client(session)
             break
 
+        # An empty message means that the client has closed the app.
+        if not data:
+            remove_client(session)
+            break
+
+        if reader is None:
+            messages = (data,)
+        else:
+            try:
+                messages = reader.feed(data)
+            except framing.FrameError as err:
+                logger.warning("[FRAME]: %s, closing connection", err)
+                remove_client(session)
+                break
+
+            # Wait for the rest of an incomplete frame.
+            if not messages:
+                continue
+
+        session.received(len(messages), len(data))
+
+        # Broadcast the received messages to all the clients.
+        publish(messages)
+
+
+def handshake(client, deadline=None):
+    ''' Send the alias prompt to a new client and receive its alias.
+        Returns a tuple of (alias, reader, pending) where reader is the
+        FrameReader of a framed client (None otherwise) and pending are
+        frames the client sent right after its alias. Raises TimeoutError
+        if the client has not answered by the deadline (time.monotonic()).
+    '''
+
+    def recv(size):
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+
+            if remaining <= 0:
+                raise TimeoutError("no alias before the deadline")
+
+            client.settimeout(remaining)
+
+        return client.recv(size)
+
+    client.send("ALIAS".encode(FORMAT))
+
+    framed, alias = framing.split_hello(recv(2048))
+
+    if framed:
+        # The alias of a framed client is its first frame.
+        reader = framing.FrameReader()
+        pending = reader.feed(alias)
+
+        while not pending:
+            data = recv(framing.RECV_SIZE)
+
+            if not data:
+                raise ConnectionResetError("closed during the handshake")
+
+            pending = reader.feed(data)
+
+        # Confirm the framed protocol.
+        client.sendall(framing.HELLO)
+        alias, pending = pending[0], pending[1:]
+    else:
+        reader, pending = None, []
+
+    client.settimeout(None)
+
+    return alias, reader, pending
+
+
+def join(client, addr, accepted_at):
+    ''' Threaded function that does the handshake with a new client, adds
+        it to the chat and handles its messages. '''
+
+    timeout = settings.config().getfloat("server", "handshake_timeout")
+
+    # Send the alias prompt to the client and receive their alias.
+    try:
+        alias, reader, pending = handshake(client, accepted_at + timeout)
+
+    except TimeoutError:
+        logger.info("[HANDSHAKE]: %s did not send an alias in time",
+                    addr[0])
+        handshakes.discard(client)
+        client.close()
+        return
+
+    except (OSError, framing.FrameError):
+        handshakes.discard(client)
+        client.close()
+        return
+
+    if not alias:
+        handshakes.discard(client)
+        client.close()
+        return
+
+    # Decode bytes format to string and remove any
+    #   leading/trailing white spaces.
+    msg1 = f"{alias.decode(FORMAT).strip()}"
+    msg2 = "new client is"
+
+    session = sessions.Session(client, msg1, addr, reader is not None)
+
+    # Start a writer thread that sends the messages queued
+    #   for the client.
+    session.queue = outbound.OutboundQueue(
+                on_overflow=functools.partial(disconnect_slow, session),
+                on_over_budget=functools.partial(over_budget, session))
+    session.writer = threading.Thread(target=outbound.write_queued,
+                                      args=(session, remove_client),
+                                      daemon=True)
+
+    # Add the client to the registry, unless the server has been stopped
+    #   during the handshake.
+    if not handshakes.admit(client, session):
+        client.close()
+        return
+
+    session.writer.start()
+
+    joined(session, accepted_at)
+
+    # Log a message indicating that a new connection was made,
+    #   with the name and IP address of the user.
+    logger.info("[NEW]: %s %s ip: %s", msg2, msg1, addr[0])
+
+    # Let all connected clients know that a new user has joined.
+    announce_join(msg1)
+
+    # Broadcast messages that a framed client sent with its alias.
+    if pending:
+        publish(pending)
+
+    handle_clients(session, reader)
+
+
+def joined(session, accepted_at):
+    ''' Record the time from accepting a client until it joined. '''
+
+    latency = time.monotonic() - accepted_at
+    metrics.join_latency.add(latency)
+
+    logger.debug("[JOIN]: %s joined %.1f ms after connecting",
+                 session.alias, latency * 1000)
+
 
 def receive():
     ''' Function to receive incoming connections and start new
-        threads for handling messages '''
+        threads for handling them. The handshake runs in the new thread,
+        so a client that never sends its alias does not hold up the
+        others. '''
 
     while True:
         try:
@@ -154,75 +610,104 @@ def receive():
             logger.error("[ACCEPT]: accepting has failed with error %s", err)
             break
 
-        # Send the alias prompt to the client and receive their alias.
-        client.send("ALIAS".encode(FORMAT))
-
-        try:
-            alias = client.recv(2048)
-        except ConnectionResetError:
-            continue
+        accepted_at = time.monotonic()
 
-        # Add the client object and alias to respective lists
-        #   for display purposes.
-        client_list.append(client)
-        alias_list.append(alias)
-
-        # Decode bytes format to string and remove any
-        #   leading/trailing white spaces.
-        msg1 = f"{alias.decode(FORMAT).strip()}"
-        msg2 = "new client is"
-
-        # Log a message indicating that a new connection was made,
-        #   with the name and IP address of the user.
-        logger.info("[NEW]: %s %s ip: %s", msg2, msg1, addr[0])
-        cast = f"\t{msg1} joined the chat...\n".encode(FORMAT)
-
-        # Send a message indicating that a new user has joined to
-        #   all connected clients.
-        broadcast(cast)
-
-        # Update user count.
-        user_count(len(client_list), True)
+        # The server is stopping.
+        if not handshakes.add(client):
+            client.close()
+            break
 
         try:
-            # Create a new thread for handling incoming messages from
-            #   the client.
-            thread = threading.Thread(target=handle_clients, args=(client,))
+            # Create a new thread for the handshake and the incoming
+            #   messages of the client.
+            thread = threading.Thread(target=join,
+                                      args=(client, addr, accepted_at))
             thread.start()
         except Exception as err:
             # Log the error.
             msg = f"starting a new thread has failed with error {err}"
             logger.error("[THREAD]: %s", msg)
+            handshakes.discard(client)
+            client.close()
+
 
+def send_presence(message):
+    ''' Broadcast a presence message (joined users, user count). '''
 
-def user_count(devices, new=False):
-    ''' Function to log the number of connected clients to the server
-        and also display in client.py '''
+    broadcast(message, outbound.PRESENCE)
 
-    sleep(0.2)
 
-    if devices > 1 and new:
-        broadcast(f"{devices} people are online...\n".encode(FORMAT))
-        logger.info("[CONNECTIONS]: %s devices are connected...", devices)
+def log_bind_help(error):
+    ''' Log a help message according to the error number of a failed
+        bind. '''
 
-    elif devices == 1 and new:
-        broadcast(f"{devices} person is online...\n".encode(FORMAT))
-        logger.info("[CONNECTIONS]: %s device is connected...", devices)
+    if error.errno == 98:
+        msg = "close client apps and server, relaunch the server"
+        msg1 = "after a minute!"
+        logger.info("[HELP]: %s %s", msg, msg1)
+    elif error.errno == 99:
+        msg = " please connect to the internet!"
+        logger.info("[HELP]: %s", msg)
 
-    elif devices == 0 and new:
-        logger.info("[CONNECTIONS]: %s devices are connected...", devices)
 
-    elif devices > 1 and not new:
-        broadcast(f"{devices} people are online...\n".encode(FORMAT))
+def start(engine=None, workers=None):
+    ''' Function to start the server and create a TCP socket objects.
+        The engine and the number of worker processes default to the ones
+        set in the .pcr_server.ini file. More than one worker runs the
+        asyncio engine in that many processes (see worker_pool.py). '''
 
-    elif devices == 1 and not new:
-        broadcast(f"{devices} person is online...\n".encode(FORMAT))
+    global SERVER_SOCKET, ENGINE, WORKERS, SAMPLER, presence_updates
 
+    if engine is None:
+        engine = settings.config().get("server", "engine")
 
-def start():
-    ''' Function to start the server and create a TCP socket objects '''
+    if engine not in ENGINES:
+        logger.critical("[ENGINE]: unknown server engine %s", engine)
+        sys.exit()
 
-    global SERVER_SOCKET
+    policy = settings.config().get("outbound", "policy")
+
+    if policy not in outbound.POLICIES:
+        logger.critical("[QUEUE]: unknown outbound policy %s", policy)
+        sys.exit()
+
+    if workers is None:
+        workers = settings.config().getint("server", "workers")
+
+    if workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        logger.warning("[WORKERS]: %s", "SO_REUSEPORT is not supported, "
+                                        "running a single process...")
+        workers = 1
+
+    ENGINE = engine
+    WORKERS = workers
+
+    # Look up the addresses of the machine in the background, the worker
+    #   processes leave that to the main process.
+    if bus is None:
+        ipv4_addresses.discover(set_public_ip, set_private_ip)
+
+    # Publish the throughput for the GUI, one sampler for the process.
+    if events.enabled() and (SAMPLER is None or not SAMPLER.is_alive()):
+        SAMPLER = threading.Thread(target=sample_throughput,
+                                   name="sampler", daemon=True)
+        SAMPLER.start()
+
+    if workers > 1:
+        # Imported here, the worker pool imports this module.
+        from pcr_utils import worker_pool
+        ENGINE = "asyncio"
+        worker_pool.start(workers)
+        return
+
+    presence_updates = presence.Presence(send_presence)
+    handshakes.open()
+
+    if engine == "asyncio":
+        # Imported here, the asyncio engine imports this module.
+        from pcr_utils import async_server
+        async_server.start()
+        return
 
     host = read_ip()
 
@@ -242,20 +727,13 @@ def start():
         logger.info(" server is starting...")
     except OSError as error:
         logger.critical("[BIND]: binding has failed! %s", error)
-
-        # Log a help message according to the error number.
-        if error.errno == 98:
-            msg = "close client apps and server, relaunch the server"
-            msg1 = "after a minute!"
-            logger.info("[HELP]: %s %s", msg, msg1)
-        elif error.errno == 99:
-            msg = " please connect to the internet!"
-            logger.info("[HELP]: %s", msg)
+        log_bind_help(error)
 
     else:
         # Start listening for incoming connections on the server.
         try:
-            SERVER_SOCKET.listen()
+            # A long backlog absorbs reconnect storms.
+            SERVER_SOCKET.listen(socket.SOMAXCONN)
         except Exception as error:
             logger.critical("[LISTEN]: listening has failed with error %s",
                             error)
@@ -270,24 +748,56 @@ def start():
 def stop():
     ''' Function to stop the server.'''
 
+    if WORKERS > 1:
+        from pcr_utils import worker_pool
+        worker_pool.stop()
+        return
+
+    if ENGINE == "asyncio":
+        from pcr_utils import async_server
+        async_server.stop()
+        return
+
     logger.info(" server stopped by user...")
 
+    # Close the connections that have not joined yet, a handshake that
+    #   finishes now does not add its client anymore.
+    for client in handshakes.close_all():
+        try:
+            client.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+        client.close()
+
     # Let the users know that the server stopped.
-    broadcast("\n\t\t\tthe server has been stopped...\n".encode(FORMAT))
-    msg = "\t\tplease close the app and relaunch once the server is online..\n"
-    broadcast(msg.encode(FORMAT))
+    for message in STOP_MESSAGES:
+        broadcast(message, outbound.CONTROL)
+
+    # Close the outbound queues and give the writers a moment to send
+    #   the messages that are still waiting.
+    clients = registry.snapshot()
 
-    # Iterate through all clients and close their connections.
-    for i, client in enumerate(client_list):
+    for session in clients:
+        session.queue.close()
+
+    deadline = time.monotonic() + 2
+
+    for session in clients:
+        session.writer.join(max(0, deadline - time.monotonic()))
+
+    # Close the connections of all clients.
+    for session in clients:
         try:
-            client.close()
-            del client_list[i]
-            del alias_list[i]
+            session.sock.shutdown(socket.SHUT_RDWR)
+            session.sock.close()
 
         except OSError as err:
             msg = " closing connection has failed with error"
             logger.warning("[CLOSE]:%s %s", msg, err)
 
+    registry.clear()
+
     # Shutdown the socket and close connections.
     try:
         SERVER_SOCKET.shutdown(socket.SHUT_RDWR)  # Shut down the socket.
@@ -7,43 +7,208 @@
 #   be used for commercial or profit purposes.
 
 '''
-server_logging.py--set up the logging for client.py.
+server_logging.py--set up the logging for the server. The loggers only put
+                   their records in a queue, a single background thread
+                   (QueueListener) formats them, writes them to the log file
+                   and the console and rotates the file. A slow disk or
+                   console never holds up the threads that send the chat.
+
+                   The handlers are created once per process from the
+                   [logging] section of the settings and shared by every
+                   logger, so each record is written once. Worker processes
+                   (see worker_pool.py) send their records to the main
+                   process with forward_to(), only the main process opens
+                   and rotates the log file.
 '''
 
+import atexit
 import logging
+import queue
+import threading
 from logging import handlers
+from pcr_utils import settings
 
+# Records waiting for the listener thread.
+_QUEUE = queue.SimpleQueue()
+_LISTENER = None
+_LOCK = threading.Lock()
 
-def server_log(name):
-    ''' Set-up the logging object. '''
+# Listeners that move the records of the worker processes to _QUEUE.
+_RELAYS = []
 
-    logger = logging.getLogger(name)
 
-    # Set log level to debug - higher than info.
-    logger.setLevel(logging.DEBUG)
+class RecordQueueHandler(handlers.QueueHandler):
+    ''' Puts the records in the queue as they are, the message is
+        formatted by the listener thread instead of the logging thread.
+        Records for another process are prepared so they can be pickled. '''
+
+    def prepare(self, record):
+        if self.queue is _QUEUE:
+            return record
+
+        return super().prepare(record)
+
+
+# The one handler of every logger set up by server_log().
+_HANDLER = RecordQueueHandler(_QUEUE)
+
+
+def options():
+    ''' Return the [logging] section of the settings. '''
+
+    return settings.config()["logging"]
+
+
+def level(name):
+    ''' Return the logging level of a level name of the settings. '''
+
+    value = logging.getLevelName(name.strip().upper())
+
+    if not isinstance(value, int):
+        raise ValueError(f"unknown logging level {name}")
+
+    return value
+
 
-    # Create a formatter object with specified format for the logs.
-    formatter = logging.Formatter(
+def start_listener():
+    ''' Create the file and console handlers of the settings and start
+        the listener thread that writes the queued records, once per
+        process. '''
+
+    global _LISTENER
+
+    with _LOCK:
+        if _LISTENER is not None:
+            return
+
+        config = options()
+
+        # Create a formatter object with specified format for the logs.
+        formatter = logging.Formatter(
                               '%(asctime)s:%(levelname)s:%(name)s:%(message)s',
                               "%Y-%m-%d %H:%M:%S")
+        sinks = []
+
+        if config.get("file"):
+            # Create file handler to handle log files rotation and backup.
+            file_handler = handlers.RotatingFileHandler(
+                config.get("file"), maxBytes=config.getint("max_bytes"),
+                backupCount=config.getint("backups"), encoding="utf-8",
+                delay=True)
+            # Set formatter for the file handler object.
+            file_handler.setFormatter(formatter)
+            sinks.append(file_handler)
+
+        if config.getboolean("console"):
+            # Create stream handler to handle logs in console.
+            stream_handler = logging.StreamHandler()
+            stream_handler.setLevel(level(config.get("console_level")))
+
+            # Set formatter for the stream handler object.
+            stream_handler.setFormatter(formatter)
+            sinks.append(stream_handler)
+
+        _LISTENER = handlers.QueueListener(_QUEUE, *sinks,
+                                           respect_handler_level=True)
+        _LISTENER.start()
+
+    # Write the records that are still queued when the program ends.
+    atexit.register(stop_listener)
+
+
+def stop_listener():
+    ''' Write the queued records and stop the listener thread. '''
+
+    global _LISTENER
+
+    with _LOCK:
+        for relay in _RELAYS:
+            relay.stop()
+
+        _RELAYS.clear()
 
-    # Create file handler to handle log files rotation and backup.
-    file_handler = handlers.RotatingFileHandler('.privateChat_server.log',
-                                                maxBytes=60000, backupCount=3)
-    # Set formatter for the file handler object.
-    file_handler.setFormatter(formatter)
+        if _LISTENER is None:
+            return
+
+        _LISTENER.stop()
+
+        for handler in _LISTENER.handlers:
+            handler.close()
+
+        _LISTENER = None
+
+
+def listen_to(record_queue):
+    ''' Write the records that other processes put in record_queue (a
+        multiprocessing queue) with the handlers of this process until
+        stop_listening() is called with the returned relay. '''
+
+    start_listener()
+
+    relay = handlers.QueueListener(record_queue, RecordQueueHandler(_QUEUE))
+    relay.start()
+
+    with _LOCK:
+        _RELAYS.append(relay)
+
+    return relay
+
+
+def stop_listening(relay):
+    ''' Write the records that are still in the queue of the relay and
+        stop it. '''
+
+    with _LOCK:
+        if relay not in _RELAYS:
+            return
+
+        _RELAYS.remove(relay)
+
+    relay.stop()
+
+
+def forward_to(record_queue):
+    ''' Send the records of this process to the process that listens to
+        record_queue instead of writing them, the log file is only opened
+        by that process. '''
+
+    global _LISTENER
+
+    _HANDLER.queue = record_queue
+
+    with _LOCK:
+        listener, _LISTENER = _LISTENER, None
+
+    if listener is None:
+        return
+
+    sinks = listener.handlers
+
+    # Forward the records that are still queued as well.
+    listener.handlers = (_HANDLER,)
+    listener.stop()
+
+    for handler in sinks:
+        handler.close()
+
+
+def server_log(name):
+    ''' Set-up the logging object, calling it again for the same name
+        returns the logger as it is. '''
+
+    logger = logging.getLogger(name)
 
-    # Add file handler to logger instance.
-    logger.addHandler(file_handler)
+    if _HANDLER in logger.handlers:
+        return logger
 
-    # Create stream handler to handle logs in console.
-    stream_handler = logging.StreamHandler()
+    logger.setLevel(level(options().get("level")))
 
-    # Set formatter for the stream handler object.
-    stream_handler.setFormatter(formatter)
+    # Records that forward_to() sends elsewhere need no local listener.
+    if _HANDLER.queue is _QUEUE:
+        start_listener()
 
-    # Add stream handler to logger instance.
-    logger.addHandler(stream_handler)
+    # Add the shared queue handler to logger instance.
+    logger.addHandler(_HANDLER)
 
     return logger
 
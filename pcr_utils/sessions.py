@@ -0,0 +1,238 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+sessions.py--the registry of the clients connected to the server. Every
+             connection is a Session, the Registry indexes them by file
+             descriptor and by alias and hands out read-only snapshots that
+             broadcast() can iterate while clients join and leave. The
+             connections that have not sent their alias yet are kept in
+             Handshakes, so stopping the server can close them too.
+'''
+
+import threading
+import time
+
+
+class Session():
+    ''' The state of one connected client. sock is the client socket,
+        stream the asyncio StreamWriter (asyncio engine only) and writer
+        the thread or task that sends the queued frames. mac is looked up
+        by server.client_macs(), None until then and "" if it was not
+        found. '''
+
+    __slots__ = ("sock", "stream", "fd", "alias", "address", "framed",
+                 "mac", "queue", "writer", "connected_at", "last_active",
+                 "messages_in", "messages_out", "bytes_in", "bytes_out")
+
+    def __init__(self, sock, alias, address, framed=False, stream=None):
+        self.sock = sock
+        self.stream = stream
+        self.fd = sock.fileno()
+        self.alias = alias
+        self.address = address
+        self.framed = framed
+        self.mac = None
+        self.queue = None
+        self.writer = None
+        self.connected_at = time.time()
+        self.last_active = self.connected_at
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def __repr__(self):
+        return f"Session({self.alias!r}, {self.address[0]}, fd={self.fd})"
+
+    def received(self, messages, nbytes):
+        ''' Count messages received from the client. '''
+
+        self.messages_in += messages
+        self.bytes_in += nbytes
+        self.last_active = time.time()
+
+    def sent(self, messages, nbytes):
+        ''' Count messages sent to the client. '''
+
+        self.messages_out += messages
+        self.bytes_out += nbytes
+
+
+class Registry():
+    ''' The connected sessions, indexed by file descriptor and by alias.
+        Adding and removing is O(1), the tuple returned by snapshot() is
+        only rebuilt after the sessions have changed and is never modified,
+        so it can be iterated without holding a lock. '''
+
+    def __init__(self):
+        self._by_fd = {}
+        self._by_alias = {}
+        self._snapshot = ()
+        self._changed = False
+        self._lock = threading.Lock()
+
+        # Messages and bytes in and out of the sessions that were removed.
+        self._closed = [0, 0, 0, 0]
+
+    def __len__(self):
+        return len(self._by_fd)
+
+    def __contains__(self, session):
+        return self._by_fd.get(session.fd) is session
+
+    def add(self, session):
+        ''' Register a new session. '''
+
+        with self._lock:
+            self._by_fd[session.fd] = session
+
+            # Aliases are not unique, the alias index holds the session
+            #   that joined last.
+            self._by_alias[session.alias] = session
+            self._changed = True
+
+    def remove(self, session):
+        ''' Remove a session, returns False if it was not registered (i.e.
+            it was already removed by another thread). '''
+
+        with self._lock:
+            # The fd of a closed socket may already belong to a new
+            #   session, only remove the session itself.
+            if self._by_fd.get(session.fd) is not session:
+                return False
+
+            del self._by_fd[session.fd]
+
+            if self._by_alias.get(session.alias) is session:
+                del self._by_alias[session.alias]
+
+            self._changed = True
+            self._count_closed(session)
+
+        return True
+
+    def get(self, fd):
+        ''' Return the session of a file descriptor or None. '''
+
+        return self._by_fd.get(fd)
+
+    def find(self, alias):
+        ''' Return the session of an alias or None. '''
+
+        return self._by_alias.get(alias)
+
+    def snapshot(self):
+        ''' Return a tuple of the connected sessions. '''
+
+        if self._changed:
+            with self._lock:
+                if self._changed:
+                    self._snapshot = tuple(self._by_fd.values())
+                    self._changed = False
+
+        return self._snapshot
+
+    def _count_closed(self, session):
+        self._closed[0] += session.messages_in
+        self._closed[1] += session.messages_out
+        self._closed[2] += session.bytes_in
+        self._closed[3] += session.bytes_out
+
+    def totals(self):
+        ''' Return the (messages_in, messages_out, bytes_in, bytes_out) of
+            all sessions since the registry was created, connected or not.
+        '''
+
+        totals = list(self._closed)
+
+        for session in self.snapshot():
+            totals[0] += session.messages_in
+            totals[1] += session.messages_out
+            totals[2] += session.bytes_in
+            totals[3] += session.bytes_out
+
+        return tuple(totals)
+
+    def clear(self):
+        ''' Remove all sessions. '''
+
+        with self._lock:
+            for session in self._by_fd.values():
+                self._count_closed(session)
+
+            self._by_fd.clear()
+            self._by_alias.clear()
+            self._snapshot = ()
+            self._changed = False
+
+
+class Handshakes():
+    ''' The connections that are still in the ALIAS handshake (sockets or
+        StreamWriters). close_all() hands them to a stopping server to
+        close and refuses new ones until open() is called again, so a
+        client that finishes its handshake after the server has stopped is
+        not added to the registry. '''
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.closed = False
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._connections)
+
+    def open(self):
+        ''' Accept new connections again (i.e. the server was started). '''
+
+        with self._lock:
+            self.closed = False
+
+    def add(self, connection):
+        ''' Track a new connection, returns False if it has to be closed
+            because the server is stopping. '''
+
+        with self._lock:
+            if self.closed:
+                return False
+
+            self._connections.add(connection)
+
+        return True
+
+    def discard(self, connection):
+        ''' Stop tracking a connection whose handshake has failed. '''
+
+        with self._lock:
+            self._connections.discard(connection)
+
+    def admit(self, connection, session):
+        ''' Add the session of a connection that finished its handshake to
+            the registry, returns False if the server has stopped and closed
+            the connection in the meantime. '''
+
+        with self._lock:
+            if connection not in self._connections:
+                return False
+
+            self._connections.remove(connection)
+            self.registry.add(session)
+
+        return True
+
+    def close_all(self):
+        ''' Refuse new connections and return the ones that are still in
+            the handshake, the caller closes them. '''
+
+        with self._lock:
+            self.closed = True
+            connections = list(self._connections)
+            self._connections.clear()
+
+        return connections
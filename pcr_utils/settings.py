@@ -0,0 +1,130 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+settings.py--read the optional server settings from the .pcr_server.ini file.
+             Every option has a default, so the file only needs to contain
+             the options that should be changed, i.e.
+
+                 [server]
+                 engine = asyncio
+'''
+
+import configparser
+
+# Name of the settings file, read from the working directory like
+#   the .pcr_ip_port.txt file.
+CONFIG_FILE = ".pcr_server.ini"
+
+# Default value of every option, by section.
+DEFAULTS = {
+    "server": {
+        # Server engine: "threads" (one thread per client) or "asyncio".
+        "engine": "threads",
+        # Seconds a new client has to answer the "ALIAS" prompt.
+        "handshake_timeout": 10,
+        # Worker processes sharing the port with SO_REUSEPORT, more than
+        #   one runs the asyncio engine in each worker.
+        "workers": 1,
+        # Seconds between the throughput samples shown by the GUI.
+        "sample_interval": 1,
+    },
+    "outbound": {
+        # Budget of messages and bytes that may wait to be sent to one
+        #   client before the policy applies.
+        "max_messages": 1000,
+        "max_bytes": 1048576,
+        # What happens to a client over its budget: "drop-oldest",
+        #   "drop-presence" or "disconnect".
+        "policy": "drop-oldest",
+        # Seconds a client may stay over its budget with the
+        #   "disconnect" policy.
+        "disconnect_after": 30,
+    },
+    "presence": {
+        # Seconds in which joins and user count changes are collected
+        #   and sent as one update.
+        "window": 0.5,
+        # Most aliases listed in one joined message.
+        "max_names": 5,
+    },
+    "framing": {
+        # Largest frame in bytes a framed client may send.
+        "max_frame": 1048576,
+    },
+    "discovery": {
+        # Seconds the addresses in the .pcr_addresses.json cache are used
+        #   before they are looked up again.
+        "public_ttl": 3600,
+        "private_ttl": 600,
+        "mac_ttl": 86400,
+        # Providers of the public IP, asked at the same time, one per line
+        #   (see public_ip.py).
+        "providers": "\n".join((
+            "json https://ipinfo.io/json",
+            "text https://api.ipify.org",
+            "text https://icanhazip.com",
+            "dns resolver1.opendns.com myip.opendns.com",
+        )),
+        # Seconds to wait for the first answer of a provider.
+        "timeout": 3,
+        # Failures in a row after which a provider is left out for
+        #   breaker_cooldown seconds.
+        "breaker_failures": 3,
+        "breaker_cooldown": 300,
+        # Seconds the neighbor table (mac addresses of the clients) is used
+        #   before it is read again, on Linux netlink keeps it up to date.
+        "neighbor_ttl": 60,
+    },
+    "logging": {
+        # Level of the server loggers (DEBUG, INFO, WARNING, ERROR).
+        "level": "DEBUG",
+        # Log file, rotated after max_bytes with backups old files kept.
+        #   Empty for no log file.
+        "file": ".privateChat_server.log",
+        "max_bytes": 60000,
+        "backups": 3,
+        # Also log to the console, only records of console_level and up.
+        "console": "yes",
+        "console_level": "DEBUG",
+    },
+    "gui": {
+        # Log lines kept in memory for the level filter and the search.
+        "buffer_lines": 50000,
+        # Most log lines in the log display, the oldest lines are removed
+        #   trim_lines at a time.
+        "max_lines": 5000,
+        "trim_lines": 500,
+    },
+}
+
+_CONFIG = None
+
+
+def config():
+    ''' Return the server settings, the file is read on the first call. '''
+
+    global _CONFIG
+
+    if _CONFIG is None:
+        parser = configparser.ConfigParser()
+        parser.read_dict(DEFAULTS)
+
+        # A missing settings file is not an error, the defaults are used.
+        parser.read(CONFIG_FILE, encoding="utf-8")
+        _CONFIG = parser
+
+    return _CONFIG
+
+
+def reload():
+    ''' Forget the cached settings, so they are read again on the next
+        call to config(). '''
+
+    global _CONFIG
+    _CONFIG = None
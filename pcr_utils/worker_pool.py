@@ -0,0 +1,446 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+worker_pool.py--run the chat room server in several worker processes, so it
+                can use more than one CPU core. Every worker runs the asyncio
+                engine on the same port with SO_REUSEPORT and the kernel
+                spreads the new connections over the workers.
+
+                The workers are connected to a bus in the main process (a
+                Unix socket). A worker publishes the chat messages of its
+                clients and its joins and user count on the bus and the bus
+                relays them to the other workers, so every user still sees
+                the whole room.
+
+                While the GUI runs, every worker also sends a report of its
+                measurements and clients to the main process once per
+                sample_interval. The main process keeps the last report of
+                each worker for the dashboard and the client table, and
+                sends the kicks of the operator to the worker of the
+                client.
+'''
+
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import struct
+import tempfile
+import threading
+from pcr_utils import events
+from pcr_utils import framing
+from pcr_utils import server_logging
+from pcr_utils import settings
+from pcr_utils.server_logging import server_log
+
+logger = server_log(__name__)
+
+# Encoding format of the aliases on the bus.
+FORMAT = "utf-8"
+
+# Every bus message is a frame, starting with the type of the message and
+#   the number of the worker that sent it.
+BUS_HEADER = struct.Struct("!cH")
+COUNT = struct.Struct("!I")  # User count of a worker.
+FD = struct.Struct("!I")  # File descriptor of a client in a worker.
+
+# Types of bus messages.
+CHAT = b"M"  # Chat messages, each of them as a frame.
+JOIN = b"J"  # A user joined, the user count of the worker and the alias.
+USERS = b"C"  # The user count of the worker has changed.
+STATS = b"S"  # Report of a worker for the main process, JSON.
+KICK = b"K"  # The main process kicks a client, its file descriptor.
+
+# Largest bus message, a batch of chat messages of one recv().
+MAX_BUS_FRAME = 64 * 1024 * 1024
+
+LOOP = None  # Event loop of the bus in the main process.
+HUB = None  # asyncio.Server object of the bus.
+PROCESSES = []  # The worker processes.
+BUS_DIR = ""  # Temporary directory of the bus socket.
+STREAMS = {}  # Bus connection of every worker in the main process.
+RELAYS = []  # Listeners that write the log records of the workers.
+REPORTS = {}  # Last report of every worker in the main process.
+
+
+class Bus():
+    ''' The connection of a worker process to the bus. It runs on the event
+        loop of the worker, publishes what happens in this worker and hands
+        what happens in the other workers to server.py. '''
+
+    def __init__(self, worker, path, interval=None):
+        self.worker = worker
+        self.path = path
+        self.interval = interval  # Seconds between reports, None for none.
+        self.remote_counts = {}  # User count of every other worker.
+        self._writer = None
+        self._task = None
+        self._reporter = None
+
+    @property
+    def remote_users(self):
+        ''' Number of users connected to the other workers. '''
+
+        return sum(self.remote_counts.values())
+
+    async def connect(self):
+        ''' Connect to the bus and start receiving from it. '''
+
+        reader, self._writer = await asyncio.open_unix_connection(self.path)
+        self._task = asyncio.ensure_future(self._receive(reader))
+
+        if self.interval is not None:
+            self._reporter = asyncio.ensure_future(self._report())
+
+        # Let the other workers know that this worker is up.
+        self.count(0)
+
+    def _send(self, kind, body):
+        if self._writer is None or self._writer.is_closing():
+            return
+
+        self._writer.write(framing.encode(
+            BUS_HEADER.pack(kind, self.worker) + body))
+
+    def publish(self, messages):
+        ''' Publish a batch of chat messages to the other workers. '''
+
+        self._send(CHAT, b"".join(framing.encode(message)
+                                  for message in messages))
+
+    def joined(self, alias, count):
+        ''' Publish a join, count is the number of users of this worker. '''
+
+        self._send(JOIN, COUNT.pack(count) + alias.encode(FORMAT))
+
+    def count(self, count):
+        ''' Publish the number of users of this worker. '''
+
+        self._send(USERS, COUNT.pack(count))
+
+    async def _report(self):
+        ''' Send the measurements and the clients of this worker to the
+            main process every interval seconds. '''
+
+        # Imported here, server.py imports this module.
+        from pcr_utils import server
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            await asyncio.sleep(self.interval)
+
+            # A lookup may run a command per client, not on the loop.
+            await loop.run_in_executor(None, server.client_macs)
+
+            report = {"stats": server.stats(),
+                      "clients": [[fd, *row] for fd, row
+                                  in server.client_rows().items()]}
+            self._send(STATS, json.dumps(report).encode(FORMAT))
+
+    async def _receive(self, reader):
+        bus_reader = framing.FrameReader(MAX_BUS_FRAME)
+
+        while True:
+            data = await reader.read(framing.RECV_SIZE)
+
+            if not data:
+                logger.warning("[WORKERS]: %s", "connection to the bus lost")
+                break
+
+            for frame in bus_reader.feed(data):
+                self._dispatch(frame)
+
+    def _dispatch(self, frame):
+        # Imported here, server.py imports this module.
+        from pcr_utils import server
+
+        kind, worker = BUS_HEADER.unpack_from(frame)
+        body = frame[BUS_HEADER.size:]
+
+        if kind == CHAT:
+            messages = framing.FrameReader(MAX_BUS_FRAME).feed(body)
+            server.broadcast_batch(messages)
+
+        elif kind == JOIN:
+            (self.remote_counts[worker],) = COUNT.unpack_from(body)
+            alias = body[COUNT.size:].decode(FORMAT)
+            server.presence_updates.joined(alias, server.online())
+
+        elif kind == USERS:
+            (self.remote_counts[worker],) = COUNT.unpack_from(body)
+            server.presence_updates.changed(server.online())
+
+        elif kind == KICK:
+            session = server.registry.get(FD.unpack_from(body)[0])
+
+            if session is not None:
+                server.kick(session)
+
+
+async def relay(reader, writer):
+    ''' Relay the messages of one worker to all the other workers. '''
+
+    bus_reader = framing.FrameReader(MAX_BUS_FRAME)
+    worker = None
+
+    try:
+        while True:
+            data = await reader.read(framing.RECV_SIZE)
+
+            if not data:
+                break
+
+            for frame in bus_reader.feed(data):
+                kind, worker = BUS_HEADER.unpack_from(frame)
+                STREAMS[worker] = writer
+
+                # Reports are for the main process only.
+                if kind == STATS:
+                    store_report(worker, frame[BUS_HEADER.size:])
+                    continue
+
+                message = framing.encode(frame)
+
+                for other, other_writer in list(STREAMS.items()):
+                    if other != worker and not other_writer.is_closing():
+                        other_writer.write(message)
+
+    except ConnectionResetError:
+        # The worker has stopped.
+        pass
+
+    except (OSError, framing.FrameError) as err:
+        logger.warning("[WORKERS]: bus connection failed! %s", err)
+
+    finally:
+        writer.close()
+
+        if worker is not None and STREAMS.get(worker) is writer:
+            del STREAMS[worker]
+            store_report(worker, None)
+
+            # The users of a stopped worker are gone.
+            message = framing.encode(BUS_HEADER.pack(USERS, worker) +
+                                     COUNT.pack(0))
+
+            for other_writer in STREAMS.values():
+                other_writer.write(message)
+
+
+def store_report(worker, body):
+    ''' Keep the report of a worker, None drops it (i.e. the worker has
+        stopped). Publishes the user count of all workers when it changes.
+    '''
+
+    before = users()
+
+    if body is None:
+        REPORTS.pop(worker, None)
+    else:
+        REPORTS[worker] = json.loads(body.decode(FORMAT))
+
+    count = users()
+
+    if count != before:
+        events.publish(events.COUNT, count=count)
+
+
+def reports():
+    ''' Return the last reports of the workers, may be called from any
+        thread. '''
+
+    return list(REPORTS.values())
+
+
+def users():
+    ''' Return the number of users of all workers by their last reports.
+    '''
+
+    # The "clients" of the stats of a worker are the users of all
+    #   workers, its own clients are the ones in its report.
+    return sum(len(report["clients"]) for report in reports())
+
+
+def stats():
+    ''' Return server.stats() of all workers by their last reports. The
+        totals are added up, the latency percentiles are the ones of the
+        slowest worker. '''
+
+    found = reports()
+    combined = {"clients": users(), "messages_in": 0, "messages_out": 0,
+                "bytes_in": 0, "bytes_out": 0, "fanout": {}, "join": {},
+                "slowest": [], "threads": threading.active_count(),
+                "tasks": 0, "workers": len(PROCESSES)}
+
+    for report in found:
+        worker_stats = report["stats"]
+
+        for key in ("messages_in", "messages_out", "bytes_in", "bytes_out",
+                    "threads", "tasks"):
+            combined[key] += worker_stats[key]
+
+        # JSON has turned the percentile points into strings.
+        for key in ("fanout", "join"):
+            for point, value in worker_stats[key].items():
+                point = int(point)
+                combined[key][point] = max(value,
+                                           combined[key].get(point, value))
+
+        combined["slowest"] += [tuple(entry)
+                                for entry in worker_stats["slowest"]]
+
+    for key in ("fanout", "join"):
+        combined[key] = dict(sorted(combined[key].items()))
+
+    combined["slowest"] = sorted(combined["slowest"],
+                                 key=lambda item: item[1], reverse=True)[:5]
+
+    return combined
+
+
+def client_rows():
+    ''' Return server.client_rows() of all workers by their last reports,
+        keyed by (worker, file descriptor). '''
+
+    return {(worker, row[0]): tuple(row[1:])
+            for worker, report in list(REPORTS.items())
+            for row in report["clients"]}
+
+
+def kick(worker, fd):
+    ''' Let a worker disconnect the client of a file descriptor, may be
+        called from any thread. Returns False if the worker is gone. '''
+
+    stream = STREAMS.get(worker)
+
+    if LOOP is None or stream is None or stream.is_closing():
+        return False
+
+    message = framing.encode(BUS_HEADER.pack(KICK, worker) + FD.pack(fd))
+    LOOP.call_soon_threadsafe(stream.write, message)
+
+    return True
+
+
+def run_worker(worker, path, log_queue, interval=None):
+    ''' Target of a worker process, runs the asyncio engine connected to
+        the bus until the main process stops it with SIGTERM. The log
+        records go to the main process through log_queue, a report every
+        interval seconds if it is not None. '''
+
+    # The main process handles Ctrl+C and stops the workers.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    server_logging.forward_to(log_queue)
+
+    from pcr_utils import server
+    server.bus = Bus(worker, path, interval)
+    server.start("asyncio", workers=1)
+
+
+async def serve(path, workers):
+    ''' Start the bus and the worker processes, then relay the bus
+        messages until stop() is called. '''
+
+    global HUB
+
+    HUB = await asyncio.start_unix_server(relay, path)
+
+    # spawn starts the workers without the threads of this process (the
+    #   GUI, the event loop).
+    context = multiprocessing.get_context("spawn")
+
+    # Only this process writes and rotates the log file.
+    log_queue = context.Queue()
+    RELAYS.append(server_logging.listen_to(log_queue))
+
+    # The workers only report while the GUI shows their clients.
+    interval = None
+
+    if events.enabled():
+        interval = settings.config().getfloat("server", "sample_interval")
+
+    for worker in range(workers):
+        process = context.Process(target=run_worker,
+                                  args=(worker, path, log_queue, interval),
+                                  name=f"pcr-worker-{worker}", daemon=True)
+        process.start()
+        PROCESSES.append(process)
+
+    logger.info("[WORKERS]: %s worker processes started...", workers)
+
+    async with HUB:
+        await HUB.serve_forever()
+
+
+def start(workers):
+    ''' Run the server in the given number of worker processes until
+        stop() is called. '''
+
+    global LOOP, BUS_DIR
+
+    BUS_DIR = tempfile.mkdtemp(prefix="pcr-bus-")
+    path = os.path.join(BUS_DIR, "bus.sock")
+
+    LOOP = asyncio.new_event_loop()
+    asyncio.set_event_loop(LOOP)
+
+    try:
+        LOOP.run_until_complete(serve(path, workers))
+
+    except asyncio.CancelledError:
+        # serve_forever() gets cancelled when the bus is closed.
+        pass
+
+    finally:
+        pending = asyncio.all_tasks(LOOP)
+
+        for task in pending:
+            task.cancel()
+
+        LOOP.run_until_complete(asyncio.gather(*pending,
+                                               return_exceptions=True))
+        LOOP.close()
+        LOOP = None
+        STREAMS.clear()
+        REPORTS.clear()
+        shutil.rmtree(BUS_DIR, ignore_errors=True)
+
+
+def stop():
+    ''' Stop the worker processes and the bus, may be called from any
+        thread. '''
+
+    logger.info(" server stopped by user...")
+
+    # SIGTERM lets every worker tell its users that the server stopped.
+    for process in PROCESSES:
+        process.terminate()
+
+    for process in PROCESSES:
+        process.join(5)
+
+        if process.is_alive():
+            logger.warning("[WORKERS]: %s did not stop, killing it",
+                           process.name)
+            process.kill()
+            process.join()
+
+    PROCESSES.clear()
+
+    for relay in RELAYS:
+        server_logging.stop_listening(relay)
+
+    RELAYS.clear()
+
+    if LOOP is not None and HUB is not None:
+        LOOP.call_soon_threadsafe(HUB.close)
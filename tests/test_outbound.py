@@ -0,0 +1,158 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+test_outbound.py--tests of the budget and the backpressure policies of the
+                  outbound queue (see outbound.py).
+
+                  python3 -m unittest discover tests
+'''
+
+import unittest
+from pcr_utils import outbound
+from pcr_utils.outbound import CHAT, CONTROL, PRESENCE
+
+
+def frame(name, kind=CHAT):
+    ''' Return a frame with the name as its payload. '''
+
+    return outbound.Frame(name.encode("ascii"), kind)
+
+
+def names(queue):
+    ''' Return the names of the queued frames, oldest first. '''
+
+    return [bytes(message.payload).decode("ascii") for message in queue.take()]
+
+
+def make_queue(policy, max_messages=3, max_bytes=1000, **kwargs):
+    ''' Return a queue with the given budget that needs no settings. '''
+
+    return outbound.OutboundQueue(max_messages=max_messages,
+                                  max_bytes=max_bytes, policy=policy,
+                                  disconnect_after=kwargs.pop(
+                                      "disconnect_after", 60.0),
+                                  **kwargs)
+
+
+class DropOldestTest(unittest.TestCase):
+
+    def test_drops_the_oldest_frames(self):
+        queue = make_queue(outbound.DROP_OLDEST)
+
+        dropped = queue.put_many([frame(f"c{index}") for index in range(5)])
+
+        self.assertEqual(dropped, 2)
+        self.assertEqual(queue.dropped, 2)
+        self.assertEqual(names(queue), ["c2", "c3", "c4"])
+
+    def test_keeps_control_frames_within_the_budget(self):
+        queue = make_queue(outbound.DROP_OLDEST)
+        queue.put(frame("ctl", CONTROL))
+
+        for index in range(10):
+            queue.put(frame(f"c{index}"))
+
+        self.assertEqual(names(queue), ["ctl", "c8", "c9"])
+
+    def test_byte_budget(self):
+        queue = make_queue(outbound.DROP_OLDEST, max_messages=100,
+                           max_bytes=6)
+
+        queue.put_many([frame("aa"), frame("bb"), frame("cc"), frame("dd")])
+
+        self.assertEqual(queue.nbytes, 6)
+        self.assertEqual(names(queue), ["bb", "cc", "dd"])
+
+    def test_put_returns_if_the_frame_was_queued(self):
+        queue = make_queue(outbound.DROP_OLDEST, max_messages=1)
+
+        self.assertTrue(queue.put(frame("c0")))
+        # An older frame is dropped, the new one is kept.
+        self.assertTrue(queue.put(frame("c1")))
+
+        queue.take()
+        queue.put(frame("ctl", CONTROL))
+        # Only the new frame may be dropped.
+        self.assertFalse(queue.put(frame("c2")))
+
+        queue.close()
+        self.assertFalse(queue.put(frame("c3")))
+
+    def test_over_budget_is_reported_once(self):
+        calls = []
+        queue = make_queue(outbound.DROP_OLDEST,
+                           on_over_budget=lambda: calls.append(True))
+
+        for index in range(10):
+            queue.put(frame(f"c{index}"))
+
+        self.assertEqual(len(calls), 1)
+
+        # Again after the writer has caught up.
+        queue.take()
+
+        for index in range(5):
+            queue.put(frame(f"c{index}"))
+
+        self.assertEqual(len(calls), 2)
+
+
+class DropPresenceTest(unittest.TestCase):
+
+    def test_drops_presence_before_chat(self):
+        queue = make_queue(outbound.DROP_PRESENCE)
+        queue.put_many([frame("c0"), frame("c1"), frame("p0", PRESENCE)])
+
+        queue.put(frame("c2"))
+
+        self.assertEqual(names(queue), ["c0", "c1", "c2"])
+
+    def test_drops_chat_without_presence(self):
+        queue = make_queue(outbound.DROP_PRESENCE)
+        queue.put_many([frame("p0", PRESENCE), frame("c0"), frame("c1"),
+                        frame("c2"), frame("c3")])
+
+        self.assertEqual(names(queue), ["c1", "c2", "c3"])
+
+    def test_keeps_control_frames(self):
+        queue = make_queue(outbound.DROP_PRESENCE)
+        queue.put_many([frame("ctl", CONTROL), frame("p0", PRESENCE),
+                        frame("c0"), frame("c1"), frame("c2")])
+
+        self.assertEqual(names(queue), ["ctl", "c1", "c2"])
+
+
+class DisconnectTest(unittest.TestCase):
+
+    def test_drops_like_drop_oldest_until_disconnect_after(self):
+        calls = []
+        queue = make_queue(outbound.DISCONNECT,
+                           on_overflow=lambda: calls.append(True))
+
+        queue.put_many([frame(f"c{index}") for index in range(5)])
+
+        self.assertEqual(calls, [])
+        self.assertFalse(queue.closed)
+        self.assertEqual(names(queue), ["c2", "c3", "c4"])
+
+    def test_disconnects_when_over_budget_too_long(self):
+        calls = []
+        queue = make_queue(outbound.DISCONNECT, disconnect_after=0.0,
+                           on_overflow=lambda: calls.append(True))
+
+        queue.put_many([frame(f"c{index}") for index in range(4)])
+        queue.put(frame("c4"))
+
+        self.assertEqual(calls, [True])
+        self.assertTrue(queue.closed)
+        self.assertEqual(len(queue), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+#!/bin/env python3
+# -*- mode: python; coding: utf-8 -*-
+
+# Script by Thomas Pirchmoser (tommy_software@mailfence.com) 2024
+
+# This script was created for personal/educational purposes only and is not to
+#   be used for commercial or profit purposes.
+
+'''
+test_presence.py--tests of the batched join messages (see presence.py).
+
+                  python3 -m unittest discover tests
+'''
+
+import unittest
+from pcr_utils.presence import joined_message
+
+
+class JoinedMessageTest(unittest.TestCase):
+
+    def test_one_alias(self):
+        self.assertEqual(joined_message(["ann"], 3),
+                         b"\tann joined the chat...\n")
+
+    def test_lists_up_to_max_names(self):
+        self.assertEqual(joined_message(["ann", "bob", "cy"], 3),
+                         b"\tann, bob and cy joined the chat...\n")
+
+    def test_one_other(self):
+        self.assertEqual(joined_message(["ann", "bob"], 1),
+                         b"\tann and 1 other joined the chat...\n")
+
+    def test_many_others(self):
+        self.assertEqual(joined_message(["ann", "bob", "cy"], 1),
+                         b"\tann and 2 others joined the chat...\n")
+
+
+if __name__ == "__main__":
+    unittest.main()